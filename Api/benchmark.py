@@ -0,0 +1,347 @@
+"""
+Load-test helpers behind the seed_benchmark_data and benchmark_api commands.
+
+Requests are driven in-process through the Django test clients, so a run needs no
+server and measures the application and database, not the network.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adrf.test import AsyncAPIClient
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Max
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from Api.bulk import create_blogs
+from Api.cache import invalidate_previews
+from Api.models import Blog, Comment, Tag, BLOG_CATEGORIES
+from Api.search import get_backend, get_write_connection
+from Api.signals import recount_tag_usage
+from Api.tasks import reconcile_blog_counters
+
+BENCHMARK_USER_PREFIX = 'bench-user-'
+WORDS = (
+    'django python api blog cache index query database sqlite latency throughput '
+    'serializer async thread request response token search tag comment feed page '
+    'cursor keyset profile image render json stream replica write read'
+).split()
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+
+def generate_data(users=20, blogs=2000, comments=10000, tags=200, seed=0, stdout=None):
+    """
+    Insert a synthetic dataset: benchmark users, blogs with 1-5 tags from a
+    Zipf-like pool, and comments spread over the blogs.
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    existing = User.objects.filter(username__startswith=BENCHMARK_USER_PREFIX).count()
+    User.objects.bulk_create([
+        User(
+            username=f'{BENCHMARK_USER_PREFIX}{i}',
+            email=f'{BENCHMARK_USER_PREFIX}{i}@example.com',
+            password='!',
+            profile_picture='images/profile_pictures/benchmark.png'
+        )
+        for i in range(existing, users)
+    ])
+    authors = list(User.objects.filter(username__startswith=BENCHMARK_USER_PREFIX).order_by('pk')[:users])
+    tag_names = [f'{rng.choice(WORDS)}{i}' for i in range(tags)]
+    categories = [category for category, _ in BLOG_CATEGORIES]
+
+    def sentence(length):
+        return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+    created = []
+    for start in range(0, blogs, 500):
+        rows = [
+            {
+                'title': sentence(rng.randint(3, 8))[:100],
+                'body': sentence(rng.randint(100, 1500)),
+                'category': rng.choice(categories),
+                'tag_names': list({tag_names[min(int(rng.paretovariate(1.2)) - 1, tags - 1)]
+                                   for _ in range(rng.randint(1, 5))}),
+            }
+            for _ in range(min(500, blogs - start))
+        ]
+        author = authors[start // 500 % len(authors)]
+        created.extend(blog.pk for blog in create_blogs(rows, author))
+        if stdout:
+            stdout.write(f'{len(created)} blogs')
+
+    for start in range(0, comments, 2000):
+        Comment.objects.bulk_create([
+            Comment(user=rng.choice(authors), blog_id=rng.choice(created), text=sentence(rng.randint(5, 40)))
+            for _ in range(min(2000, comments - start))
+        ])
+    reconcile_blog_counters()
+    invalidate_previews(categories)
+    return {'users': len(authors), 'blogs': len(created), 'comments': comments}
+
+
+def generate_tag_links(links, tags=1000, tags_per_blog=5, seed=0, stdout=None):
+    """
+    Add short blogs with `tags_per_blog` tags each from a Zipf-like pool of `tags`
+    "bench-tag-" tags until there are `links` blog-tag links, for benchmarking tag
+    filters. Rows are bulk inserted, 2000 blogs per transaction. Returns the number
+    of blogs added.
+    """
+    rng = random.Random(seed)
+    missing = links - Blog.tags.through.objects.count()
+    if missing <= 0:
+        return 0
+    author = get_user_model().objects.filter(username__startswith=BENCHMARK_USER_PREFIX).order_by('pk').first()
+    if author is None:
+        author = get_user_model().objects.create(
+            username=f'{BENCHMARK_USER_PREFIX}0',
+            email=f'{BENCHMARK_USER_PREFIX}0@example.com',
+            password='!',
+            profile_picture='images/profile_pictures/benchmark.png'
+        )
+    pool = Tag.objects.resolve([f'bench-tag-{i}' for i in range(tags)])
+    tags_per_blog = min(tags_per_blog, tags)
+    categories = [category for category, _ in BLOG_CATEGORIES]
+    first_slug = (Blog.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    total = math.ceil(missing / tags_per_blog)
+
+    for start in range(0, total, 2000):
+        blogs = []
+        for number in range(first_slug + start, first_slug + min(start + 2000, total)):
+            blog = Blog(
+                title=' '.join(rng.choices(WORDS, k=5)),
+                slug=f'tag-links-{number}',
+                body=' '.join(rng.choices(WORDS, k=40)),
+                author=author,
+                category=rng.choice(categories),
+                tag_count=tags_per_blog,
+            )
+            blog.refresh_derived_fields()
+            blog._slug_preset = True
+            blogs.append(blog)
+        with transaction.atomic():
+            Blog.objects.bulk_create(blogs)
+            tag_links = []
+            for blog in blogs:
+                tags_of_blog = set()
+                while len(tags_of_blog) < tags_per_blog:
+                    tags_of_blog.add(pool[min(int(rng.paretovariate(1.2)) - 1, tags - 1)].pk)
+                tag_links.extend(Blog.tags.through(blog_id=blog.pk, tag_id=tag_id) for tag_id in tags_of_blog)
+            Blog.tags.through.objects.bulk_create(tag_links)
+            get_backend().index_rows(
+                get_write_connection(),
+                [(blog.pk, blog.title, blog.body, author.username) for blog in blogs]
+            )
+        if stdout:
+            stdout.write(f'{start + len(blogs)} tagged blogs')
+
+    recount_tag_usage(tag.pk for tag in pool)
+    invalidate_previews(categories)
+    return total
+
+
+def default_scenarios(rng, user, write_weight=1):
+    """
+    (name, weight, build request) tuples; each builder returns (method, path, data).
+    Writes are made as `user`, who can only comment on their own blogs; their weights
+    are multiplied by `write_weight`.
+    """
+    slugs = list(Blog.objects.order_by('?').values_list('slug', flat=True)[:200])
+    blog_ids = list(Blog.objects.filter(author=user).order_by('?').values_list('pk', flat=True)[:200])
+    categories = [category for category, _ in BLOG_CATEGORIES]
+    return [
+        ('preview', 30, lambda: ('get', '/blogs/preview/', {'page': rng.randint(1, 5)})),
+        ('preview_category', 15, lambda: ('get', '/blogs/preview/', {'category': rng.choice(categories)})),
+        ('preview_search', 10, lambda: ('get', '/blogs/preview/', {'search': rng.choice(WORDS)})),
+        ('preview_cursor', 10, lambda: ('get', '/blogs/preview/', {'pagination': 'cursor'})),
+        ('blog_detail', 20, lambda: ('get', f'/blogs/{rng.choice(slugs)}/', None)),
+        ('comments', 10, lambda: ('get', '/comments/', {'page': rng.randint(1, 5)})),
+        ('create_blog', 3 * write_weight, lambda: ('post', '/blogs/', {
+            'title': f'Benchmark {rng.random()}', 'body': ' '.join(rng.choices(WORDS, k=200)),
+            'category': rng.choice(categories), 'tag_names': rng.sample(WORDS, 3),
+        })),
+        ('create_comment', 2 * write_weight, lambda: ('post', '/comments/', {
+            'blog': rng.choice(blog_ids), 'text': 'Benchmark',
+        })),
+    ]
+
+
+def replay_scenarios(path):
+    """
+    Scenarios replaying an NDJSON file of {"method", "path", "data"} objects in order.
+    """
+    with open(path) as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    lock = threading.Lock()
+    position = iter(range(10 ** 12))
+
+    def next_request():
+        with lock:
+            entry = entries[next(position) % len(entries)]
+        return entry.get('method', 'get').lower(), entry['path'], entry.get('data')
+
+    return [('replay', 1, next_request)]
+
+
+def plan_requests(scenarios, requests, seed):
+    """
+    Scenario names of `requests` requests, picked by weight.
+    """
+    rng = random.Random(seed)
+    names = [name for name, _, _ in scenarios]
+    return rng.choices(names, weights=[weight for _, weight, _ in scenarios], k=requests)
+
+
+def run(scenarios, requests=1000, concurrency=1, seed=0, user=None, host='localhost', client_delay=0):
+    """
+    Issue `requests` requests picked from the weighted scenarios over `concurrency`
+    threads, each with its own client and database connection. `host` must be in
+    ALLOWED_HOSTS. `client_delay` seconds before each request model a slow client,
+    which holds a WSGI worker thread while it sends its request. Throttling is off
+    for the run.
+    """
+    names = [name for name, _, _ in scenarios]
+    builders = {name: build for name, _, build in scenarios}
+    plan = plan_requests(scenarios, requests, seed)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    def worker(chunk):
+        # Server errors (e.g. "database is locked") are counted, not raised.
+        client = APIClient(raise_request_exception=False, HTTP_HOST=host)
+        if user is not None:
+            client.force_authenticate(user=user)
+        for name in chunk:
+            method, path, data = builders[name]()
+            start = time.perf_counter()
+            if client_delay:
+                time.sleep(client_delay)
+            if method == 'get':
+                response = client.get(path, data)
+            else:
+                response = getattr(client, method)(path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latencies[name].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    def thread_worker(chunk):
+        try:
+            worker(chunk)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    # One user sends every request, which its throttle buckets would cap.
+    with override_settings(THROTTLE_ENABLED=False):
+        if concurrency <= 1:
+            worker(plan)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(thread_worker, [plan[i::concurrency] for i in range(concurrency)]))
+    elapsed = time.perf_counter() - start
+    return summarize_results(names, latencies, errors, elapsed)
+
+
+async def arun(scenarios, requests=1000, concurrency=1, seed=0, user=None, client_delay=0):
+    """
+    run() through the ASGI handler: `concurrency` clients in flight on one event loop.
+    A slow client's `client_delay` is awaited, so it holds no thread. The async test
+    client always sends Host: testserver, so that host is allowed for the run.
+    """
+    names = [name for name, _, _ in scenarios]
+    builders = {name: build for name, _, build in scenarios}
+    plan = plan_requests(scenarios, requests, seed)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    async def worker(chunk):
+        client = AsyncAPIClient(raise_request_exception=False)
+        if user is not None:
+            client.force_authenticate(user=user)
+        for name in chunk:
+            method, path, data = builders[name]()
+            start = time.perf_counter()
+            if client_delay:
+                await asyncio.sleep(client_delay)
+            # Like Django's ASGIHandler, which the test client bypasses: each request's
+            # sync code gets its own thread instead of sharing one with every request.
+            async with ThreadSensitiveContext():
+                if method == 'get':
+                    response = await client.get(path, data)
+                else:
+                    response = await getattr(client, method)(path, data, format='json')
+                if response.streaming:
+                    async for _ in response:
+                        pass
+            latencies[name].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_ENABLED=False):
+        await asyncio.gather(*[worker(plan[i::concurrency]) for i in range(max(concurrency, 1))])
+    elapsed = time.perf_counter() - start
+    return summarize_results(names, latencies, errors, elapsed)
+
+
+def summarize_results(names, latencies, errors, elapsed):
+    results = {
+        'total': summarize([latency for values in latencies.values() for latency in values], elapsed),
+        'scenarios': {},
+    }
+    for name in names:
+        if latencies[name]:
+            results['scenarios'][name] = {**summarize(latencies[name], elapsed), 'errors': errors[name]}
+    results['total']['errors'] = sum(errors.values())
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of `results` against `baseline`: p95 latency more than `tolerance`
+    higher, or throughput more than `tolerance` lower, per scenario and in total.
+    """
+    regressions = []
+    pairs = [('total', results['total'], baseline.get('total', {}))]
+    pairs += [
+        (name, stats, baseline.get('scenarios', {}).get(name, {}))
+        for name, stats in results['scenarios'].items()
+    ]
+    for name, current, previous in pairs:
+        if current.get('p95_ms') and previous.get('p95_ms'):
+            if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {previous['p95_ms']}ms")
+        if name == 'total' and current.get('rps') and previous.get('rps'):
+            if current['rps'] < previous['rps'] * (1 - tolerance):
+                regressions.append(f"{name}: {current['rps']} req/s < baseline {previous['rps']} req/s")
+    return regressions
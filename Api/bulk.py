@@ -0,0 +1,115 @@
+from collections import Counter
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.utils.encoders import JSONEncoder
+
+from Api.cache import invalidate_previews
+from Api.models import Blog, Tag, tag_key
+from Api.search import get_backend, get_write_connection
+from Api.signals import adjust_tag_usage
+from Api.serializers import BlogSerializer, BlogExportSerializer
+
+CHUNK_SIZE = 500
+
+
+def import_blogs(lines, author, chunk_size=CHUNK_SIZE):
+    """
+    Validate (line number, object) pairs with BlogSerializer and insert the valid ones
+    for `author`, one transaction and a handful of bulk queries per chunk.
+    Returns the number of blogs created and the errors of the rejected lines.
+    """
+    created = 0
+    errors = []
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for line_number, data in chunk:
+            if not isinstance(data, dict):
+                errors.append({'line': line_number, 'errors': data if isinstance(data, str) else 'Expected an object.'})
+                continue
+            serializer = BlogSerializer(data=data)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({'line': line_number, 'errors': serializer.errors})
+        if valid:
+            created += len(create_blogs(valid, author))
+    return created, errors
+
+
+def create_blogs(validated_rows, author):
+    """
+    bulk_create bypasses save() and signals, so the slugs, derived fields, tag links,
+    counters, search index and preview cache are maintained here for the whole chunk at once.
+    """
+    with transaction.atomic():
+        tags = {
+            tag.name_key: tag
+            for tag in Tag.objects.resolve(name for row in validated_rows for name in row.get('tag_names', []))
+        }
+        blogs = []
+        blog_tags = []
+        for row in validated_rows:
+            row = dict(row)
+            row.pop('tags', None)
+            names = {tag_key(name) for name in row.pop('tag_names', []) if name.strip()}
+            blog = Blog(author=author, **row)
+            blog.tag_count = len(names)
+            blog.refresh_derived_fields()
+            blogs.append(blog)
+            blog_tags.append([tags[name] for name in names])
+        assign_unique_slugs(blogs)
+        Blog.objects.bulk_create(blogs)
+        Blog.tags.through.objects.bulk_create([
+            Blog.tags.through(blog_id=blog.pk, tag_id=tag.pk)
+            for blog, tags_of_blog in zip(blogs, blog_tags)
+            for tag in tags_of_blog
+        ])
+        usage = Counter(tag.pk for tags_of_blog in blog_tags for tag in tags_of_blog)
+        for count in set(usage.values()):
+            adjust_tag_usage([tag_id for tag_id, used in usage.items() if used == count], count)
+        get_backend().index_rows(
+            get_write_connection(),
+            [(blog.pk, blog.title, blog.body, author.username) for blog in blogs]
+        )
+        invalidate_previews({blog.category for blog in blogs})
+    return blogs
+
+
+def assign_unique_slugs(blogs):
+    """
+    Pre-assign slugs unique against the table and the rest of the chunk, with
+    autoslug's "-2", "-3" suffixes: its own per-row check can't see unsaved siblings.
+    """
+    field = Blog._meta.get_field('slug')
+    bases = [field.slugify(blog.title)[:field.max_length] or 'blog' for blog in blogs]
+    taken = set(Blog.objects.filter(
+        reduce(or_, (Q(slug__startswith=base) for base in set(bases)))
+    ).values_list('slug', flat=True))
+    for blog, base in zip(blogs, bases):
+        slug, index = base, 2
+        while slug in taken:
+            suffix = f'-{index}'
+            slug = base[:field.max_length - len(suffix)] + suffix
+            index += 1
+        taken.add(slug)
+        blog.slug = slug
+        blog._slug_preset = True
+
+
+def export_blogs(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield one NDJSON line per blog. The queryset is read with a server-side
+    cursor in chunks, with tags prefetched per chunk.
+    """
+    queryset = queryset.select_related('author').prefetch_related('tags')
+    encoder = JSONEncoder(ensure_ascii=False)
+    for blog in queryset.iterator(chunk_size=chunk_size):
+        yield encoder.encode(BlogExportSerializer(blog).data) + '\n'
@@ -0,0 +1,220 @@
+import hashlib
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from Api.conditional import conditional_response, aconditional_response
+from Api.routers import use_primary
+
+ALL_BLOGS = 'all'
+TOP_TAGS_KEY = 'tags:top'
+
+
+def get_cache():
+    return caches[settings.BLOG_PREVIEW_CACHE_ALIAS]
+
+
+def category_scope(category):
+    # Quoted: categories contain spaces, which memcached keys can't.
+    return f'category:{quote(category)}'
+
+
+def generation_key(scope):
+    return f'blog-preview:generation:{scope}'
+
+
+def get_generation(cache, scope):
+    key = generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        # A fresh, never-used generation, so entries written before an eviction stay unreachable.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(cache, scope):
+    key = generation_key(scope)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(cache, scope):
+    try:
+        cache.incr(generation_key(scope))
+    except ValueError:
+        cache.set(generation_key(scope), time.time_ns(), timeout=None)
+
+
+def get_scope(request):
+    """
+    Feeds filtered on exactly one category only depend on that category's blogs;
+    any other feed may include any blog.
+    """
+    categories = request.query_params.getlist('category')
+    if len(categories) == 1 and categories[0]:
+        return category_scope(categories[0])
+    return ALL_BLOGS
+
+
+def get_cache_key(request, scope, generation):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    # Responses embed absolute URLs, so the host and scheme are part of the key.
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = repr((request.scheme, request.get_host(), request.path, getattr(renderer, 'format', None), params))
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f'blog-preview:{scope}:{generation}:{digest}'
+
+
+def cached_preview_response(request, get_validators, build_data):
+    """
+    Respond to a preview request from the cache. Entries hold the page's conditional
+    GET validators next to its serialized data, so a hit runs no queries at all, and
+    a miss only serializes the page when the client's copy is stale. Misses read from
+    the primary.
+    """
+    cache = get_cache()
+    scope = get_scope(request)
+    key = get_cache_key(request, scope, get_generation(cache, scope))
+    entry = cache.get(key)
+    if entry is None:
+        # Built on the primary: a lagging replica would cache stale data past the
+        # invalidation that a write has just made.
+        with use_primary():
+            validators = get_validators()
+    else:
+        validators = entry[0]
+
+    def build_response():
+        if entry is not None:
+            return Response(entry[1])
+        with use_primary():
+            data = build_data()
+        cache.set(key, (validators, data), timeout=settings.BLOG_PREVIEW_CACHE_TIMEOUT)
+        return Response(data)
+
+    return conditional_response(request, validators, build_response)
+
+
+async def acached_preview_response(request, get_validators, build_data):
+    """
+    cached_preview_response for async views: get_validators and build_data return awaitables.
+    """
+    cache = get_cache()
+    scope = get_scope(request)
+    key = get_cache_key(request, scope, await aget_generation(cache, scope))
+    entry = await cache.aget(key)
+    if entry is None:
+        with use_primary():
+            validators = await get_validators()
+    else:
+        validators = entry[0]
+
+    async def build_response():
+        if entry is not None:
+            return Response(entry[1])
+        with use_primary():
+            data = await build_data()
+        await cache.aset(key, (validators, data), timeout=settings.BLOG_PREVIEW_CACHE_TIMEOUT)
+        return Response(data)
+
+    return await aconditional_response(request, validators, build_response)
+
+
+def invalidate_previews(categories):
+    """
+    Drop cached previews that may include blogs from the given categories. Pages
+    filtered on other categories stay cached. Bumped again on commit, so a page
+    cached by a concurrent reader before this transaction committed is dropped too.
+    """
+    scopes = {ALL_BLOGS} | {category_scope(category) for category in categories if category}
+
+    def bump():
+        cache = get_cache()
+        for scope in scopes:
+            bump_generation(cache, scope)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def top_tags_sort_key(row):
+    tag_id, name, usage_count = row
+    return -usage_count, name
+
+
+def get_top_tags(limit):
+    """
+    (id, name, usage_count) of the `limit` most used tags, from a cached list of the top
+    TOP_TAGS_CACHE_SIZE that update_top_tags keeps current.
+    """
+    from Api.models import Tag
+
+    cache = get_cache()
+    rows = cache.get(TOP_TAGS_KEY)
+    if rows is None:
+        rows = list(Tag.objects.filter(usage_count__gt=0).order_by('-usage_count', 'name').values_list(
+            'id', 'name', 'usage_count'
+        )[:settings.TOP_TAGS_CACHE_SIZE])
+        cache.set(TOP_TAGS_KEY, rows, timeout=settings.TOP_TAGS_CACHE_TIMEOUT)
+    return rows[:limit]
+
+
+def update_top_tags(rows):
+    """
+    Fold the current (id, name, usage_count) of changed tags into the cached top list;
+    deleted tags count 0. A tag dropping out of a full list could be replaced by any
+    other tag, so then the list is dropped and the next read rebuilds it.
+    """
+    cache = get_cache()
+    top = cache.get(TOP_TAGS_KEY)
+    if top is None:
+        return
+    size = settings.TOP_TAGS_CACHE_SIZE
+    full = len(top) >= size
+    last = top_tags_sort_key(top[-1]) if top else None
+    tags = {row[0]: tuple(row) for row in top}
+    for row in rows:
+        tag_id, _, usage_count = row
+        ranks_below = full and top_tags_sort_key(row) > last
+        if tag_id in tags:
+            if ranks_below or (full and not usage_count):
+                cache.delete(TOP_TAGS_KEY)
+                return
+            tags[tag_id] = tuple(row)
+        elif not ranks_below:
+            tags[tag_id] = tuple(row)
+    top = sorted((row for row in tags.values() if row[2]), key=top_tags_sort_key)[:size]
+    cache.set(TOP_TAGS_KEY, top, timeout=settings.TOP_TAGS_CACHE_TIMEOUT)
+
+
+def refresh_top_tags(tag_ids):
+    """
+    Update the cached top list with the committed state of the given tags, after the
+    current transaction commits.
+    """
+    tag_ids = set(tag_ids)
+
+    def refresh():
+        from Api.models import Tag
+
+        if get_cache().get(TOP_TAGS_KEY) is None:
+            return
+        rows = list(Tag.objects.filter(pk__in=tag_ids).values_list('id', 'name', 'usage_count'))
+        found = {row[0] for row in rows}
+        update_top_tags(rows + [(tag_id, '', 0) for tag_id in tag_ids - found])
+
+    if tag_ids:
+        transaction.on_commit(refresh)
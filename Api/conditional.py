@@ -0,0 +1,111 @@
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+PAGE_VALIDATOR_FIELDS = ('id', 'updated', 'comment_count', 'tag_count')
+LIST_VALIDATOR_AGGREGATES = {'last_updated': Max('updated'), 'count': Count('id'), 'comments': Sum('comment_count')}
+
+
+def make_etag(request, *parts):
+    # The rendered body differs per format (json, browsable API), so the format is part of the tag.
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = repr((getattr(renderer, 'format', None), *parts))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def blog_detail_validators(request, queryset, slug):
+    """
+    ETag and Last-Modified of one blog from a single-row lookup, or None if it doesn't exist.
+    Counter, tag and author changes move `updated` too (BlogQuerySet.touch), so both
+    validators change whenever the representation does.
+    """
+    return detail_validators(request, detail_validators_queryset(queryset, slug).first())
+
+
+async def ablog_detail_validators(request, queryset, slug):
+    return detail_validators(request, await detail_validators_queryset(queryset, slug).afirst())
+
+
+def detail_validators_queryset(queryset, slug):
+    return queryset.order_by().filter(slug=slug).values('slug', 'updated', 'comment_count', 'tag_count')
+
+
+def detail_validators(request, row):
+    if row is None:
+        return None
+    return make_etag(request, *row.values()), row['updated']
+
+
+def blog_list_validators(request, queryset, page_queryset=None):
+    """
+    ETag of a filtered list from one aggregate query: the newest update, the number of
+    blogs and their total comments change whenever the page could. When the page's own
+    rows are cheap to get (keyset pagination), they are used instead, so no query has
+    to touch the whole filtered set.
+
+    Lists have no Last-Modified, so If-Modified-Since is ignored: deleting a blog
+    changes the list but not the newest `updated` of what is left.
+    """
+    if page_queryset is not None:
+        return page_validators(request, list(page_queryset.values_list(*PAGE_VALIDATOR_FIELDS)))
+    return aggregate_validators(request, queryset.order_by().aggregate(**LIST_VALIDATOR_AGGREGATES))
+
+
+async def ablog_list_validators(request, queryset, page_queryset=None):
+    if page_queryset is not None:
+        return page_validators(request, [row async for row in page_queryset.values_list(*PAGE_VALIDATOR_FIELDS)])
+    return aggregate_validators(request, await queryset.order_by().aaggregate(**LIST_VALIDATOR_AGGREGATES))
+
+
+def page_validators(request, rows):
+    return make_etag(request, request.get_full_path(), rows), None
+
+
+def aggregate_validators(request, row):
+    return make_etag(request, request.get_full_path(), *row.values()), None
+
+
+def conditional_response(request, validators, build_response):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 (or 412) before building the
+    response, and attach the validators to a full response.
+    """
+    if validators is None:
+        return build_response()
+    response = get_validated_response(request, validators)
+    if response is not None:
+        return response
+    return add_validators(build_response(), validators)
+
+
+async def aconditional_response(request, validators, build_response):
+    """
+    conditional_response for async views: build_response returns an awaitable.
+    """
+    if validators is None:
+        return await build_response()
+    response = get_validated_response(request, validators)
+    if response is not None:
+        return response
+    return add_validators(await build_response(), validators)
+
+
+def get_timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def get_validated_response(request, validators):
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=get_timestamp(last_modified))
+
+
+def add_validators(response, validators):
+    etag, last_modified = validators
+    if response.status_code == 200:
+        response['ETag'] = etag
+        timestamp = get_timestamp(last_modified)
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
@@ -1,7 +1,9 @@
 import django_filters
-from django.db.models import Q
+from django.db.models import Count
+from django.db.models.functions import Lower
 
-from Api.models import Blog, BLOG_CATEGORIES, Tag
+from Api.models import Blog, BLOG_CATEGORIES, Tag, tag_key
+from Api.search import search
 
 
 class BlogFilter(django_filters.FilterSet):
@@ -15,6 +17,7 @@ class BlogFilter(django_filters.FilterSet):
     tags = django_filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags',
+        method='filter_by_tags',
         label='Tags'
     )
 
@@ -23,12 +26,23 @@ class BlogFilter(django_filters.FilterSet):
         label='Tag Names (comma-separated)'
     )
 
+    tag_mode = django_filters.ChoiceFilter(
+        choices=[('any', 'Any of the tags'), ('all', 'All of the tags')],
+        method='filter_tag_mode',
+        label='Tag Mode (for tags and tag_names)'
+    )
+
     author = django_filters.CharFilter(
         field_name='author__username',
         lookup_expr='icontains',
         label='Author Username'
     )
 
+    author_exact = django_filters.CharFilter(
+        method='filter_author_exact',
+        label='Author Username (exact, case-insensitive)'
+    )
+
     created_after = django_filters.DateTimeFilter(
         field_name='created',
         lookup_expr='gte',
@@ -48,24 +62,50 @@ class BlogFilter(django_filters.FilterSet):
 
     def filter_search(self, queryset, name, value):
         """
-        Search in title, body, and author username
+        Ranked full-text search in title, body, and author username
         """
         if value:
-            return queryset.filter(
-                Q(title__icontains=value) |
-                Q(body__icontains=value) |
-                Q(author__username__icontains=value)
-            ).distinct()
+            return search(queryset, value)
         return queryset
 
-    def filter_by_tag_names(self, queryset, name, value):
+    def filter_author_exact(self, queryset, name, value):
         """
-        Filter by comma-separated tag names
-        Example: ?tag_names=python,django,web
+        Case-insensitive exact username match, served by the LOWER(username) index
+        (iexact compiles to LIKE or UPPER(), which can't use it)
         """
         if value:
-            tag_names = [name.strip() for name in value.split(',')]
-            return queryset.filter(tags__name__in=tag_names).distinct()
+            return queryset.alias(author_lower=Lower('author__username')).filter(author_lower=value.lower())
+        return queryset
+
+    def filter_by_tag_names(self, queryset, name, value):
+        """
+        Filter by comma-separated tag names, matched case-insensitively by the name_key index
+        Example: ?tag_names=python,django,web&tag_mode=all
+        """
+        tag_names = {tag_key(name) for name in value.split(',') if name.strip()}
+        if not tag_names:
+            return queryset
+        tag_ids = Tag.objects.filter(name_key__in=tag_names).values('pk')
+        return self.filter_tagged(queryset, tag_ids, len(tag_names))
+
+    def filter_by_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return self.filter_tagged(queryset, [tag.pk for tag in value], len(value))
+
+    def filter_tagged(self, queryset, tag_ids, count):
+        """
+        Blogs with any, or with tag_mode=all all `count`, of the tags: a semi-join on the
+        blog-tag links, grouped by blog and counted for all, so no DISTINCT over blog rows.
+        """
+        links = Blog.tags.through.objects.filter(tag_id__in=tag_ids)
+        if self.form.cleaned_data.get('tag_mode') == 'all':
+            # Each (blog, tag) link is unique, so blogs linked to `count` of the tags have all of them.
+            links = links.values('blog_id').annotate(matched=Count('tag_id')).filter(matched=count)
+        return queryset.filter(pk__in=links.values('blog_id'))
+
+    def filter_tag_mode(self, queryset, name, value):
+        # Read by filter_tagged.
         return queryset
 
     def filter_has_tags(self, queryset, name, value):
@@ -86,3 +126,33 @@ class BlogFilter(django_filters.FilterSet):
             'created': ['gte', 'lte', 'exact'],
             'updated': ['gte', 'lte', 'exact'],
         }
+
+
+class TagFilter(django_filters.FilterSet):
+    prefix = django_filters.CharFilter(method='filter_prefix', label='Name prefix')
+
+    ordering = django_filters.ChoiceFilter(
+        method='filter_ordering',
+        choices=[('popular', 'Most used first'), ('name', 'By name')],
+        label='Ordering'
+    )
+
+    def filter_prefix(self, queryset, name, value):
+        """
+        Case-insensitive name prefix, as a range on the name_key index
+        (istartswith compiles to LIKE or UPPER(), which can't use it)
+        """
+        value = tag_key(value)
+        if not value:
+            return queryset
+        upper_bound = value[:-1] + chr(ord(value[-1]) + 1)
+        return queryset.filter(name_key__gte=value, name_key__lt=upper_bound)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'name':
+            return queryset.order_by('name')
+        return queryset.order_by('-usage_count', 'name')
+
+    class Meta:
+        model = Tag
+        fields = []
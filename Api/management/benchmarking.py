@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+def run_benchmark_api(name, arguments, env=None):
+    """
+    Run benchmark_api with `arguments` in its own process, with `env` added to the
+    environment, and return its results; `name` labels the run in errors.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'results.json')
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_api', *arguments, '--output', output
+        ]
+        completed = subprocess.run(command, env={**os.environ, **(env or {})}, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f'benchmark_api failed for {name}:\n{completed.stderr}')
+        with open(output) as file:
+            return json.load(file)
+
+
+def write_results(stdout, results, label, output=None):
+    """
+    Write a table of the total of each benchmark_api run in `results`, keyed by name,
+    and dump `results` as JSON to the `output` path if there is one.
+    """
+    width = max([len(label), *map(len, results)]) + 4
+    stdout.write(f"{label:<{width}}{'requests/s':>12}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        total = result['total']
+        stdout.write(
+            f"{name:<{width}}{total['rps']:>12}{total['errors']:>8}"
+            f"{total['p50_ms']:>10}{total['p95_ms']:>10}{total['p99_ms']:>10}"
+        )
+    if output:
+        with open(output, 'w') as file:
+            json.dump(results, file, indent=2)
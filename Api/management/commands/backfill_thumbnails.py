@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from Api.models import BlogUser
+from Api.thumbnails import read_picture, render_thumbnails, store_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate profile picture thumbnails of existing users, resizing in a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes (default: one per CPU; 1 resizes in this process).')
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument('--all', action='store_true', help='Regenerate existing thumbnails too.')
+
+    def handle(self, *args, **options):
+        users = BlogUser.objects.exclude(profile_picture='').only('profile_picture')
+        if not options['all']:
+            users = users.filter(Q(thumbnail_webp='') | Q(thumbnail_jpeg=''))
+        users = users.order_by('pk')
+
+        # Settings are passed explicitly: workers may be spawned without Django configured.
+        render = partial(safe_render, size=settings.PROFILE_THUMBNAIL_SIZE, quality=settings.PROFILE_THUMBNAIL_QUALITY)
+        processes = options['processes']
+        executor = ProcessPoolExecutor(max_workers=processes) if processes != 1 else None
+        generated = failed = 0
+        last_pk = 0
+        try:
+            while True:
+                chunk = list(users.filter(pk__gt=last_pk)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                # Files are read and written here; only the resizing runs in the workers.
+                pictures = [(user, read_picture(user)) for user in chunk]
+                pictures = [(user, data) for user, data in pictures if data is not None]
+                failed += len(chunk) - len(pictures)
+                datas = [data for _, data in pictures]
+                results = executor.map(render, datas) if executor else map(render, datas)
+                for (user, _), rendered in zip(pictures, results):
+                    if rendered is not None and store_thumbnails(user.pk, user.profile_picture.name, rendered):
+                        generated += 1
+                    else:
+                        failed += 1
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Generated thumbnails of {generated} users, {failed} failed.'))
+
+
+def safe_render(data, size, quality):
+    try:
+        return render_thumbnails(data, size, quality)
+    except (OSError, ValueError):
+        return None
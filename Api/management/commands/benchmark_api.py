@@ -0,0 +1,76 @@
+import asyncio
+import json
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.benchmark import BENCHMARK_USER_PREFIX, default_scenarios, replay_scenarios, run, arun, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the API in-process with a weighted mix of reads and authenticated writes '
+        '(or a replayed NDJSON request log) and report p50/p95/p99 latency and requests per second. '
+        'Run seed_benchmark_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Client threads through WSGI, clients in flight through ASGI.')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Drive the WSGI or the ASGI handler.')
+        parser.add_argument('--client-delay', type=float, default=0,
+                            help='Milliseconds each client takes to send its request, modelling slow clients.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--write-weight', type=float, default=1,
+                            help='Multiplier of the weights of the write scenarios.')
+        parser.add_argument('--replay', help='NDJSON file of {"method", "path", "data"} requests to replay.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Fail if results regress against this results file.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative regression of p95 latency and throughput.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username__startswith=BENCHMARK_USER_PREFIX).order_by('pk').first()
+        if user is None:
+            raise CommandError('No benchmark data, run seed_benchmark_data first.')
+        if options['replay']:
+            scenarios = replay_scenarios(options['replay'])
+        else:
+            scenarios = default_scenarios(random.Random(options['seed']), user, options['write_weight'])
+
+        config = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'user': user,
+            'client_delay': options['client_delay'] / 1000,
+        }
+        if options['server'] == 'asgi':
+            results = asyncio.run(arun(scenarios, **config))
+        else:
+            results = run(scenarios, **config)
+        results['config'] = {
+            key: options[key]
+            for key in ('requests', 'concurrency', 'seed', 'write_weight', 'replay', 'server', 'client_delay')
+        }
+
+        self.stdout.write(f"{'scenario':<20}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in [*results['scenarios'].items(), ('total', results['total'])]:
+            self.stdout.write(
+                f"{name:<20}{stats['requests']:>10}{stats['errors']:>8}"
+                f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+            )
+        self.stdout.write(f"{results['total']['rps']} requests/s")
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                regressions = compare(results, json.load(file), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from Api.management.benchmarking import run_benchmark_api, write_results
+
+# name: (benchmark_api --server, BLOG_ASYNC_VIEWS)
+SETUPS = {
+    'wsgi': ('wsgi', '0'),
+    'asgi-sync-views': ('asgi', '0'),
+    'asgi': ('asgi', '1'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the read throughput of WSGI, with a fixed pool of worker threads, and ASGI, with sync '
+        'and with async views, under slow clients. Each setup runs benchmark_api in its own process. '
+        'Run seed_benchmark_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads.')
+        parser.add_argument('--concurrency', type=int, default=64, help='ASGI clients in flight.')
+        parser.add_argument('--client-delay', type=float, default=200,
+                            help='Milliseconds each client takes to send its request.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results of every setup as JSON to this file.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, (server, async_views) in SETUPS.items():
+            concurrency = options['threads'] if server == 'wsgi' else options['concurrency']
+            self.stdout.write(f'Benchmarking {name}...')
+            results[name] = run_benchmark_api(name, [
+                '--server', server,
+                '--requests', str(options['requests']),
+                '--concurrency', str(concurrency),
+                '--client-delay', str(options['client_delay']),
+                '--write-weight', '0',
+                '--seed', str(options['seed']),
+            ], env={'BLOG_ASYNC_VIEWS': async_views})
+        write_results(self.stdout, results, 'setup', options['output'])
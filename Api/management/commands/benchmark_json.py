@@ -0,0 +1,123 @@
+import io
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from Api.models import Blog, Comment
+from Api.parsers import FastJSONParser
+from Api.renderers import FastJSONRenderer
+from Api.serializers import BlogValuesSerializer, PreviewBlogValuesSerializer, BlogCommentSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how fast JSONRenderer renders pages of blogs, previews and comments, and JSONParser '
+        'parses blog and comment request bodies, against their orjson counterparts, and check that both '
+        'give the same output. Run seed_benchmark_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200, help='Renders or parses of each payload.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if not Blog.objects.exists():
+            raise CommandError('No blogs, run seed_benchmark_data first.')
+        repeat = options['repeat']
+        # Pages embed absolute URLs, which need an allowed host.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            responses = self.get_responses(options['page_size'])
+
+        results = {'render': {}, 'parse': {}}
+        for name, data in responses.items():
+            if FastJSONRenderer().render(data) != JSONRenderer().render(data):
+                raise CommandError(f'FastJSONRenderer output differs for {name}.')
+            results['render'][name] = self.compare(
+                len(JSONRenderer().render(data)),
+                self.measure(lambda: JSONRenderer().render(data), repeat),
+                self.measure(lambda: FastJSONRenderer().render(data), repeat),
+            )
+        for name, body in self.get_request_bodies(options['page_size']).items():
+            if self.parse(FastJSONParser(), body) != self.parse(JSONParser(), body):
+                raise CommandError(f'FastJSONParser output differs for {name}.')
+            results['parse'][name] = self.compare(
+                len(body),
+                self.measure(lambda: self.parse(JSONParser(), body), repeat),
+                self.measure(lambda: self.parse(FastJSONParser(), body), repeat),
+            )
+
+        for operation, payloads in results.items():
+            self.stdout.write(f"{operation:<10}{'bytes':>10}{'json ms':>10}{'orjson ms':>11}{'speedup':>9}")
+            for name, result in payloads.items():
+                self.stdout.write(
+                    f"  {name:<8}{result['bytes']:>10}{result['json_ms']:>10}{result['orjson_ms']:>11}"
+                    f"{result['speedup']:>9}"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def get_responses(self, page_size):
+        """
+        A page of each of the main list responses, as their views build them.
+        """
+        context = {'request': Request(RequestFactory().get('/blogs/'))}
+        blogs = Blog.objects.select_related('author')[:page_size]
+        comments = Comment.objects.select_related('user')[:page_size]
+        return {
+            'blogs': {
+                'count': Blog.objects.count(),
+                'next': None,
+                'previous': None,
+                'results': BlogValuesSerializer(BlogValuesSerializer.values_queryset(blogs), context=context).data,
+            },
+            'previews': {
+                'next': None,
+                'results': PreviewBlogValuesSerializer(
+                    PreviewBlogValuesSerializer.values_queryset(blogs), context=context
+                ).data,
+            },
+            'comments': {
+                'next': None,
+                'results': BlogCommentSerializer(comments, many=True, context=context).data,
+            },
+        }
+
+    def get_request_bodies(self, page_size):
+        """
+        Bodies of blog and comment writes, from existing rows.
+        """
+        blogs = [
+            {'title': title, 'body': body, 'category': category, 'tag_names': ['python', 'django']}
+            for title, body, category in Blog.objects.values_list('title', 'body', 'category')[:page_size]
+        ]
+        comment = Comment.objects.values('blog', 'text').first() or {'blog': 1, 'text': 'Comment'}
+        return {
+            'blog': json.dumps(blogs[0]).encode(),
+            'comment': json.dumps(comment).encode(),
+            'blogs': json.dumps(blogs).encode(),
+        }
+
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), parser_context={})
+
+    def measure(self, function, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat
+
+    def compare(self, size, seconds, fast_seconds):
+        return {
+            'bytes': size,
+            'json_ms': round(seconds * 1000, 3),
+            'orjson_ms': round(fast_seconds * 1000, 3),
+            'speedup': round(seconds / fast_seconds, 2),
+        }
@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from Api.models import Blog
+from Api.serializers import PreviewBlogSerializer, BlogSerializer, PreviewBlogValuesSerializer, \
+    BlogValuesSerializer
+
+# name: (model serializer, values serializer, columns the model queryset defers)
+PAIRS = {
+    'preview': (PreviewBlogSerializer, PreviewBlogValuesSerializer, ['body']),
+    'list': (BlogSerializer, BlogValuesSerializer, []),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the rows per second that the blog preview and list serializers and their .values() '
+        'stand-ins load and serialize, pages included, and check that their output is identical. '
+        'Run seed_benchmark_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--pages', type=int, default=50, help='Pages serialized per measurement.')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements per serializer; the best counts.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        # Pages embed absolute URLs, which need an allowed host.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            results = self.benchmark(options['page_size'], options['pages'], options['repeat'])
+
+        self.stdout.write(f"{'serializer':<12}{'model rows/s':>14}{'values rows/s':>15}{'speedup':>9}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12}{result['model_rows_per_second']:>14}{result['values_rows_per_second']:>15}"
+                f"{result['speedup']:>9}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def benchmark(self, page_size, pages, repeat):
+        pages = min(pages, Blog.objects.count() // page_size)
+        if not pages:
+            raise CommandError('Not enough blogs, run seed_benchmark_data first.')
+        context = {'request': Request(RequestFactory().get('/blogs/'))}
+        queryset = Blog.objects.select_related('author').prefetch_related('tags')
+        slices = [queryset[page * page_size:(page + 1) * page_size] for page in range(pages)]
+
+        results = {}
+        for name, (serializer_class, values_serializer_class, deferred) in PAIRS.items():
+            def serialize_models():
+                return [
+                    serializer_class(page.defer(*deferred), many=True, context=context).data for page in slices
+                ]
+
+            def serialize_values():
+                return [
+                    values_serializer_class(values_serializer_class.values_queryset(page), context=context).data
+                    for page in slices
+                ]
+
+            if JSONRenderer().render(serialize_models()) != JSONRenderer().render(serialize_values()):
+                raise CommandError(
+                    f'{values_serializer_class.__name__} output differs from {serializer_class.__name__}.'
+                )
+            rows = pages * page_size
+            model_rps = rows / self.measure(serialize_models, repeat)
+            values_rps = rows / self.measure(serialize_values, repeat)
+            results[name] = {
+                'model_rows_per_second': round(model_rps),
+                'values_rows_per_second': round(values_rps),
+                'speedup': round(values_rps / model_rps, 2),
+            }
+        return results
+
+    def measure(self, serialize, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serialize()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
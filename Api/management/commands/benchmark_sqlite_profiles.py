@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Api.management.benchmarking import run_benchmark_api, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Run benchmark_api with a mixed read/write load once per DATABASE_PROFILES entry, each on '
+        'its own copy of the seeded SQLite database and in its own process, and compare throughput. '
+        'Run seed_benchmark_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(settings.DATABASE_PROFILES))
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--write-weight', type=float, default=5,
+                            help='Multiplier of the write scenario weights; 5 makes about a fifth of requests writes.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results of every profile as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+        profiles = [profile for profile in options['profiles'].split(',') if profile]
+        unknown = set(profiles) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in profiles:
+                database = os.path.join(directory, f'{profile}.sqlite3')
+                self.copy_database(database)
+                self.stdout.write(f'Benchmarking the {profile} profile...')
+                results[profile] = run_benchmark_api(f'the {profile} profile', [
+                    '--requests', str(options['requests']),
+                    '--concurrency', str(options['concurrency']),
+                    '--write-weight', str(options['write_weight']),
+                    '--seed', str(options['seed']),
+                ], env={'BLOG_DB_PROFILE': profile, 'BLOG_SQLITE_PATH': database})
+        write_results(self.stdout, results, 'profile', options['output'])
+
+    def copy_database(self, path):
+        """
+        Copy the default database, through the open connection so an in-memory one works too,
+        in rollback-journal mode; the production profile switches its copy to WAL.
+        """
+        source = connections['default']
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.connection.backup(target)
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
@@ -0,0 +1,105 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.filters import BlogFilter
+from Api.models import Blog, Tag, tag_key
+from Api.pagination import KeysetPagination
+
+PAGE_SIZE = KeysetPagination.page_size or 10
+
+
+def join_distinct(queryset, names, mode):
+    """
+    The previous plans: a join and DISTINCT for any, a join per tag for all. Tags are
+    matched on the indexed name_key, like BlogFilter matches them.
+    """
+    keys = [tag_key(name) for name in names]
+    if mode == 'any':
+        return queryset.filter(tags__name_key__in=keys).distinct()
+    for key in keys:
+        queryset = queryset.filter(tags__name_key=key)
+    return queryset
+
+
+def semi_join(queryset, names, mode):
+    filterset = BlogFilter({'tag_names': ','.join(names), 'tag_mode': mode}, queryset=queryset)
+    if not filterset.is_valid():
+        raise CommandError(str(filterset.errors))
+    return filterset.qs
+
+
+PLANS = {
+    'join_distinct': join_distinct,
+    'semi_join': semi_join,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the first page (COUNT and page rows) of tag_names filters in any and all mode, with the '
+        'previous join plans and with BlogFilter, for tag sets of different popularity. '
+        'Run seed_benchmark_data --tag-links 1000000 first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each query; the median counts.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        links = Blog.tags.through.objects.count()
+        tag_sets = self.get_tag_sets()
+        if not tag_sets:
+            raise CommandError('Not enough tags, run seed_benchmark_data first.')
+        self.stdout.write(f'{links} blog-tag links')
+
+        queryset = Blog.objects.order_by('-created', '-id')
+        results = {}
+        self.stdout.write(f"{'tag set':<16}{'mode':<6}{'blogs':>8}" + ''.join(f'{plan + " ms":>18}' for plan in PLANS))
+        for set_name, names in tag_sets.items():
+            for mode in ('any', 'all'):
+                timings = {}
+                counts = set()
+                for plan_name, plan in PLANS.items():
+                    filtered = plan(queryset, names, mode)
+                    counts.add(filtered.count())
+                    timings[plan_name] = self.measure(filtered, options['repeat'])
+                if len(counts) != 1:
+                    raise CommandError(f'The plans disagree on {set_name} in {mode} mode: {sorted(counts)}')
+                results[f'{set_name}:{mode}'] = {'tags': names, 'blogs': counts.pop(), 'ms': timings}
+                self.stdout.write(
+                    f"{set_name:<16}{mode:<6}{results[f'{set_name}:{mode}']['blogs']:>8}"
+                    + ''.join(f'{timings[plan]:>18}' for plan in PLANS)
+                )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'links': links, 'results': results}, file, indent=2)
+
+    def get_tag_sets(self):
+        """
+        Tag names by popularity: the most used tags, a popular and a middling tag, three
+        middling tags and the least used tags.
+        """
+        names = list(
+            Tag.objects.filter(usage_count__gt=0).order_by('-usage_count', 'name').values_list('name', flat=True)
+        )
+        if len(names) < 8:
+            return {}
+        middle = len(names) // 4
+        return {
+            'top2': names[:2],
+            'top_and_middle': [names[0], names[middle]],
+            'middle3': names[middle:middle + 3],
+            'rare2': names[-2:],
+        }
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset.count()
+            list(queryset.values_list('id', flat=True)[:PAGE_SIZE])
+            timings.append(time.perf_counter() - start)
+        return round(statistics.median(timings) * 1000, 2)
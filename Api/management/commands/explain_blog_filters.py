@@ -0,0 +1,104 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Api.filters import BlogFilter
+from Api.models import Blog, Comment, Tag
+from Api.pagination import KeysetPagination
+
+# Plan lines reading a whole table rather than a range of an index.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\b(USING|VIRTUAL TABLE)\b)'),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+    'mysql': re.compile(r'\btype\W+ALL\b'),
+}
+# Plan lines sorting the rows instead of reading them in index order.
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+    'mysql': re.compile(r'Using filesort'),
+}
+
+
+def blog_filter_shapes():
+    """
+    (name, query params) of each BlogFilter query shape, with values sampled from the data.
+    """
+    blog = Blog.objects.select_related('author').first()
+    tags = list(Tag.objects.order_by('pk')[:2])
+    tag = tags[0] if tags else None
+    category = blog.category if blog else 'SPORTS'
+    username = blog.author.username if blog else 'user'
+    created = blog.created.isoformat() if blog else '2024-01-01T00:00:00'
+    tag_name = tag.name if tag else 'tag'
+    tag_names = ','.join(tag.name for tag in tags) or 'tag'
+    return [
+        ('all', {}),
+        ('category', {'category': category}),
+        ('author_exact', {'author_exact': username}),
+        ('author', {'author': username}),
+        ('created_range', {'created_after': created, 'created_before': created}),
+        ('updated_range', {'updated__gte': created, 'updated__lte': created}),
+        ('category_created_range', {'category': category, 'created_after': created}),
+        ('slug', {'slug': blog.slug if blog else 'slug'}),
+        ('title', {'title__icontains': 'a'}),
+        ('search', {'search': 'django'}),
+        ('tags', {'tags': [tag.pk if tag else 1]}),
+        ('tags_all', {'tags': [tag.pk for tag in tags] or [1], 'tag_mode': 'all'}),
+        ('tag_names', {'tag_names': tag_name}),
+        ('tag_names_all', {'tag_names': tag_names, 'tag_mode': 'all'}),
+        ('has_tags', {'has_tags': 'true'}),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the first page of every BlogFilter and comment list query shape and flag full scans and sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when a full scan is found, e.g. in CI.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan.')
+
+    def handle(self, *args, **options):
+        full_scan = FULL_SCAN_PATTERNS.get(connection.vendor)
+        sort = SORT_PATTERNS.get(connection.vendor)
+        if full_scan is None:
+            raise CommandError(f'No plan patterns for the {connection.vendor} backend.')
+
+        scans = []
+        for name, queryset in self.get_querysets():
+            plan = queryset.explain()
+            lines = plan.splitlines()
+            if any(full_scan.search(line) for line in lines):
+                scans.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: full scan'))
+            elif sort and any(sort.search(line) for line in lines):
+                # Ranked search and other selective filters may sort a few rows on purpose.
+                self.stdout.write(self.style.WARNING(f'{name}: sort'))
+            else:
+                self.stdout.write(f'{name}: ok')
+                if not options['verbose_plans']:
+                    continue
+            self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if scans and options['fail_on_scan']:
+            raise CommandError(f"Full scans in: {', '.join(scans)}")
+        self.stdout.write(self.style.SUCCESS(f'{len(scans)} query shapes with full scans.'))
+
+    def get_querysets(self):
+        page_size = KeysetPagination.page_size or 10
+        base = Blog.objects.select_related('author')
+        for name, params in blog_filter_shapes():
+            filterset = BlogFilter(params, queryset=base)
+            if not filterset.is_valid():
+                raise CommandError(f'{name}: {filterset.errors}')
+            queryset = filterset.qs
+            yield f'blogs?{name}', queryset[:page_size]
+            # Keyset pagination orders by the unique ('-created', '-id').
+            yield f'blogs?{name}&pagination=cursor', queryset.order_by(*KeysetPagination.ordering)[:page_size + 1]
+
+        comment = Comment.objects.first()
+        yield 'comments', Comment.objects.all()[:page_size]
+        yield 'comments?blog', Comment.objects.filter(blog_id=comment.blog_id if comment else 1)[:page_size]
+        yield 'comments?user', Comment.objects.filter(user_id=comment.user_id if comment else 1)[:page_size]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from Api.cache import invalidate_previews
+from Api.models import BLOG_CATEGORIES
+from Api.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the blog full-text search index from the Blog table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        count = backend.rebuild(chunk_size=options['chunk_size'])
+        # Cached search results may have been served from the stale index.
+        invalidate_previews([category for category, _ in BLOG_CATEGORIES])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} blogs with {type(backend).__name__}.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from Api.benchmark import generate_data, generate_tag_links
+
+
+class Command(BaseCommand):
+    help = 'Insert a synthetic dataset of users, blogs, tags and comments for benchmark_api.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--blogs', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--tag-links', type=int, default=0,
+                            help='Then add tagged blogs until there are this many blog-tag links, '
+                                 'for benchmark_tag_filters.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        counts = generate_data(
+            users=options['users'],
+            blogs=options['blogs'],
+            comments=options['comments'],
+            tags=options['tags'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['blogs']} blogs and {counts['comments']} comments for {counts['users']} users."
+        ))
+        if options['tag_links']:
+            added = generate_tag_links(options['tag_links'], seed=options['seed'])
+            self.stdout.write(self.style.SUCCESS(f'Added {added} tagged blogs.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+# name: (task, every, period)
+DEFAULT_PERIODIC_TASKS = {
+    'Purge expired OAuth2 tokens': ('Api.tasks.clear_tokens', 1, IntervalSchedule.HOURS),
+    'Reconcile blog counters': ('Api.tasks.reconcile_blog_counters', 1, IntervalSchedule.DAYS),
+}
+
+
+class Command(BaseCommand):
+    help = 'Create or update the default django_celery_beat schedules of the Api tasks.'
+
+    def handle(self, *args, **options):
+        for name, (task, every, period) in DEFAULT_PERIODIC_TASKS.items():
+            schedule, _ = IntervalSchedule.objects.get_or_create(every=every, period=period)
+            _, created = PeriodicTask.objects.update_or_create(
+                name=name,
+                defaults={'task': task, 'interval': schedule, 'enabled': True},
+            )
+            self.stdout.write(f"{'Created' if created else 'Updated'} '{name}': {task} every {every} {period}.")
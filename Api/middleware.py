@@ -0,0 +1,292 @@
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import aauthenticate
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from oauth2_provider.middleware import OAuth2TokenMiddleware
+
+from Api.routers import read_database, get_replicas, choose_replica, get_client_key, is_pinned, pin_to_primary, \
+    ais_pinned, apin_to_primary
+
+logger = logging.getLogger('Api.timing')
+
+DEFAULT_REQUEST_TIMING = {
+    'ENABLED': True,
+    'SERVER_TIMING_HEADER': True,
+    # Fraction of requests whose timings are sent to the sink.
+    'SAMPLE_RATE': 0.01,
+    'SINK': 'Api.middleware.log_timing',
+}
+
+
+def get_timing_settings():
+    return {**DEFAULT_REQUEST_TIMING, **getattr(settings, 'REQUEST_TIMING', {})}
+
+
+def log_timing(record):
+    logger.info(json.dumps(record, separators=(',', ':')))
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting queries and the time spent running them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+# The QueryTimer of the current request. A context variable rather than a wrapper per
+# request, so queries that async views run in worker threads are counted too.
+active_query_timer = ContextVar('active_query_timer', default=None)
+
+
+def timed_execute(execute, sql, params, many, context):
+    timer = active_query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+connection_created.connect(install_query_timer)
+
+
+class RequestTimingMiddleware:
+    """
+    Measures DB queries, DB time, response rendering time and total time of every
+    request, reports them in a Server-Timing header and sends a sampled structured
+    record to REQUEST_TIMING['SINK']. Rendering is the renderer encoding response.data;
+    serializers build that data in the view, so their time counts as app time.
+    Keep it first in MIDDLEWARE so the total covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = get_timing_settings()
+        self.enabled = config['ENABLED']
+        self.header = config['SERVER_TIMING_HEADER']
+        self.sample_rate = config['SAMPLE_RATE']
+        self.sink = import_string(config['SINK'])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        start, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            active_query_timer.reset(token)
+        self.report(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        start, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_query_timer.reset(token)
+        self.report(request, response, start)
+        return response
+
+    def start(self, request):
+        # Connections opened before this module was imported lack the wrapper.
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        request._timing = {'view': None, 'render_start': None, 'render': 0.0, 'timer': QueryTimer()}
+        return time.perf_counter(), active_query_timer.set(request._timing['timer'])
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_timing'):
+            request._timing['view'] = get_view_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after every process_template_response hook has run.
+        if hasattr(request, '_timing'):
+            timing = request._timing
+            timing['render_start'] = time.perf_counter()
+
+            def rendered(response):
+                timing['render'] = time.perf_counter() - timing['render_start']
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, start):
+        if response.streaming:
+            # The body runs its queries as it is sent, after the headers: a streamed
+            # response gets no Server-Timing, and its record is sent once it is done.
+            response.streaming_content = self.report_when_streamed(request, response, start)
+            return
+        metrics = self.get_metrics(request, time.perf_counter() - start)
+        if self.header:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics["db_ms"]:.1f};desc="{metrics["queries"]} queries"',
+                f'render;dur={metrics["render_ms"]:.1f}',
+                f'app;dur={metrics["app_ms"]:.1f}',
+                f'total;dur={metrics["total_ms"]:.1f}',
+            ])
+        self.sample(request, response, metrics)
+
+    def report_when_streamed(self, request, response, start):
+        content = response.streaming_content
+        if response.is_async:
+            async def timed_content():
+                try:
+                    async for part in content:
+                        yield part
+                finally:
+                    self.sample(request, response, self.get_metrics(request, time.perf_counter() - start))
+        else:
+            def timed_content():
+                try:
+                    yield from content
+                finally:
+                    self.sample(request, response, self.get_metrics(request, time.perf_counter() - start))
+        return timed_content()
+
+    def get_metrics(self, request, total):
+        timing = request._timing
+        timer = timing['timer']
+        render = timing['render']
+        return {
+            'queries': timer.count,
+            'db_ms': round(timer.duration * 1000, 3),
+            'render_ms': round(render * 1000, 3),
+            'app_ms': round(max(total - timer.duration - render, 0.0) * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }
+
+    def sample(self, request, response, metrics):
+        if self.sample_rate and random.random() < self.sample_rate:
+            self.sink({
+                'method': request.method,
+                'path': request.path,
+                'view': request._timing['view'],
+                'status': response.status_code,
+                **metrics,
+            })
+
+
+class ReadReplicaMiddleware:
+    """
+    Routes the reads of safe-method requests to a read replica, unless the client has
+    written within the last REPLICA_PIN_SECONDS; unsafe requests pin their client to
+    the primary for that long.
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not get_replicas():
+            return self.get_response(request)
+        client_key = get_client_key(request)
+        safe = request.method in self.safe_methods
+        database = choose_replica() if safe and not is_pinned(client_key) else None
+        token = read_database.set(database)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if not safe:
+            pin_to_primary(client_key)
+        return response
+
+    async def __acall__(self, request):
+        if not get_replicas():
+            return await self.get_response(request)
+        client_key = get_client_key(request)
+        safe = request.method in self.safe_methods
+        database = choose_replica() if safe and not await ais_pinned(client_key) else None
+        token = read_database.set(database)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if not safe:
+            await apin_to_primary(client_key)
+        return response
+
+
+class AsyncOAuth2TokenMiddleware(OAuth2TokenMiddleware):
+    """
+    oauth2_provider's OAuth2TokenMiddleware, able to run in an async middleware chain:
+    a sync-only middleware would make ASGI requests hold a thread through async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if request.META.get('HTTP_AUTHORIZATION', '').startswith('Bearer'):
+            user = await request.auser() if hasattr(request, 'auser') else None
+            if user is None or user.is_anonymous:
+                user = await aauthenticate(request=request)
+                if user:
+                    request.user = request._cached_user = request._acached_user = user
+        response = await self.get_response(request)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+def get_view_name(request, view_func):
+    """
+    "BlogViewSet.preview" for viewset actions, the view's name otherwise.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action is None:
+        return cls.__name__
+    return f'{cls.__name__}.{action}'
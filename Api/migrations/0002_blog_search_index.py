@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:14
+
+from django.db import migrations
+
+# The search index as this migration created it, frozen here rather than imported
+# from Api.search, whose backends may change.
+CREATE_INDEX_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_blog_search "
+        "USING fts5(title, body, author, tokenize='unicode61 remove_diacritics 2')",
+        "INSERT INTO api_blog_search(api_blog_search, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS api_blog_search (blog_id bigint PRIMARY KEY, document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS api_blog_search_document ON api_blog_search USING gin(document)",
+    ],
+}
+INDEX_ROW_SQL = {
+    'sqlite': "INSERT INTO api_blog_search(rowid, title, body, author) VALUES (%s, %s, %s, %s)",
+    'postgresql': (
+        "INSERT INTO api_blog_search(blog_id, document) VALUES (%s, "
+        "setweight(to_tsvector('english', %s), 'A') || "
+        "setweight(to_tsvector('english', %s), 'C') || "
+        "setweight(to_tsvector('simple', %s), 'B')) "
+        "ON CONFLICT (blog_id) DO UPDATE SET document = EXCLUDED.document"
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_INDEX_SQL:
+        return
+    with connection.cursor() as cursor:
+        for sql in CREATE_INDEX_SQL[connection.vendor]:
+            cursor.execute(sql)
+    Blog = apps.get_model('Api', 'Blog')
+    rows = Blog.objects.using(connection.alias).order_by().values_list('id', 'title', 'body', 'author__username')
+    chunk = []
+    for row in rows.iterator(chunk_size=500):
+        chunk.append(row)
+        if len(chunk) >= 500:
+            index_rows(connection, chunk)
+            chunk = []
+    index_rows(connection, chunk)
+
+
+def index_rows(connection, rows):
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(INDEX_ROW_SQL[connection.vendor], rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX_SQL:
+        schema_editor.execute('DROP TABLE IF EXISTS api_blog_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
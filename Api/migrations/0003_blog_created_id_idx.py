@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0002_blog_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['-created', '-id'], name='blog_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Blog = apps.get_model('Api', 'Blog')
+    Comment = apps.get_model('Api', 'Comment')
+    db = schema_editor.connection.alias
+    comment_counts = Comment.objects.using(db).filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+    tag_counts = Blog.tags.through.objects.using(db).filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+    Blog.objects.using(db).update(
+        comment_count=Coalesce(Subquery(comment_counts), 0),
+        tag_count=Coalesce(Subquery(tag_counts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0003_blog_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='tag_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
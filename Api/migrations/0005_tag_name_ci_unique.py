@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_name_keys(apps, schema_editor):
+    """
+    Set name_key to the Python-lowered name (Api.models.tag_key as of this migration),
+    folding tags whose keys collide into the oldest one, so the case-insensitive unique
+    constraint can be added.
+    """
+    Tag = apps.get_model('Api', 'Tag')
+    Blog = apps.get_model('Api', 'Blog')
+    BlogTag = Blog.tags.through
+    db = schema_editor.connection.alias
+    tags_by_key = {}
+    for tag_id, name in Tag.objects.using(db).order_by('id').values_list('id', 'name').iterator():
+        tags_by_key.setdefault(name.strip().lower(), []).append(tag_id)
+
+    affected_blogs = set()
+    kept = []
+    for key, tag_ids in tags_by_key.items():
+        keep, merged = tag_ids[0], tag_ids[1:]
+        kept.append(Tag(id=keep, name_key=key))
+        if not merged:
+            continue
+        links = BlogTag.objects.using(db).filter(tag_id__in=merged)
+        blog_ids = set(links.values_list('blog_id', flat=True))
+        already_tagged = set(BlogTag.objects.using(db).filter(
+            tag_id=keep, blog_id__in=blog_ids
+        ).values_list('blog_id', flat=True))
+        BlogTag.objects.using(db).bulk_create(
+            [BlogTag(blog_id=blog_id, tag_id=keep) for blog_id in blog_ids - already_tagged]
+        )
+        links.delete()
+        Tag.objects.using(db).filter(id__in=merged).delete()
+        affected_blogs |= blog_ids
+    Tag.objects.using(db).bulk_update(kept, ['name_key'], batch_size=500)
+
+    tag_counts = BlogTag.objects.using(db).filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+    Blog.objects.using(db).filter(pk__in=affected_blogs).update(tag_count=Coalesce(Subquery(tag_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0004_blog_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=30),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_name_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('name_key',), name='tag_name_ci_unique'),
+        ),
+    ]
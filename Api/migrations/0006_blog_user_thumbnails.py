@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0005_tag_name_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bloguser',
+            name='thumbnail_jpeg',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/profile_thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='bloguser',
+            name='thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/profile_thumbnails'),
+        ),
+    ]
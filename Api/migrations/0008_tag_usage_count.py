@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_usage_counts(apps, schema_editor):
+    Blog = apps.get_model('Api', 'Blog')
+    Tag = apps.get_model('Api', 'Tag')
+    db = schema_editor.connection.alias
+    usage_counts = Blog.tags.through.objects.using(db).filter(
+        tag=OuterRef('pk')
+    ).order_by().values('tag').annotate(count=Count('*')).values('count')
+    Tag.objects.using(db).update(usage_count=Coalesce(Subquery(usage_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0007_query_shape_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-usage_count', 'name'], name='tag_usage_name_idx'),
+        ),
+        migrations.RunPython(backfill_usage_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:03
+
+import math
+
+from django.db import migrations, models
+
+PREVIEW_WORDS = 30
+WORDS_PER_MINUTE = 200
+
+
+def backfill_preview_fields(apps, schema_editor):
+    # Blog.refresh_derived_fields as of this migration; historical models have no custom methods.
+    Blog = apps.get_model('Api', 'Blog')
+    db = schema_editor.connection.alias
+    last_pk = 0
+    while True:
+        blogs = list(Blog.objects.using(db).filter(pk__gt=last_pk).order_by('pk').only('id', 'body')[:500])
+        if not blogs:
+            break
+        last_pk = blogs[-1].pk
+        for blog in blogs:
+            blog.preview_body = ' '.join(blog.body.split(" ", PREVIEW_WORDS)[:PREVIEW_WORDS])
+            blog.word_count = len(blog.body.split())
+            blog.reading_time = math.ceil(blog.word_count / WORDS_PER_MINUTE)
+        Blog.objects.using(db).bulk_update(blogs, ['preview_body', 'word_count', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0008_tag_usage_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='preview_body',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_preview_fields, migrations.RunPython.noop),
+    ]
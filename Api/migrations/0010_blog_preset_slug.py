@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:10
+
+import Api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Api', '0009_blog_preview_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blog',
+            name='slug',
+            field=Api.models.PresetAutoSlugField(editable=False, populate_from='title', unique=True),
+        ),
+    ]
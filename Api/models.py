@@ -1,6 +1,10 @@
+import math
+
 from autoslug import AutoSlugField
 from django.contrib.auth.models import User, AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 BLOG_CATEGORIES = [
     ("SPORTS", "SPORTS"), ("EDUCATION", "EDUCATION"), ("ENTERTAINMENT", "ENTERTAINMENT"),
@@ -12,6 +16,34 @@ BLOG_CATEGORIES = [
 class BlogUser(AbstractUser):
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to="images/profile_pictures")
+    # Made from profile_picture by Api.tasks.generate_profile_thumbnails; blank until ready.
+    thumbnail_webp = models.ImageField(upload_to="images/profile_thumbnails", blank=True, editable=False)
+    thumbnail_jpeg = models.ImageField(upload_to="images/profile_thumbnails", blank=True, editable=False)
+
+    # Fields shown with every blog of the user; changing them invalidates derived data.
+    DISPLAY_FIELDS = ['username', 'profile_picture']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_display_fields()
+        return instance
+
+    def remember_display_fields(self):
+        # Deferred fields are skipped: reading them here would load them, one query each.
+        self._loaded_fields = {
+            field: str(self.__dict__[field]) for field in self.DISPLAY_FIELDS if field in self.__dict__
+        }
+
+    def display_fields_changed(self, fields):
+        loaded = getattr(self, '_loaded_fields', None)
+        if loaded is None:
+            return True
+        return any(
+            field not in loaded or loaded[field] != str(self.__dict__[field])
+            for field in fields
+            if field in self.__dict__
+        )
 
     def __str__(self):
         return str(self.username)
@@ -19,46 +51,182 @@ class BlogUser(AbstractUser):
     class Meta:
         verbose_name = "Blog User"
         verbose_name_plural = "Blog Users"
+        indexes = [
+            # Case-insensitive username lookups, e.g. BlogFilter's author_exact.
+            models.Index(Lower('username'), name='bloguser_username_lower_idx'),
+        ]
+
+
+def tag_key(name):
+    """
+    The case-insensitive identity of a tag name. Folded in Python rather than with SQL
+    LOWER(), which SQLite only applies to ASCII letters.
+    """
+    return name.strip().lower()
+
+
+class TagManager(models.Manager):
+    def resolve(self, names):
+        """
+        Return Tags for `names` in order, matched case-insensitively, creating the missing
+        ones: one lookup and one bulk insert however many names there are. Conflicting
+        inserts from concurrent writers are ignored and the winners' rows re-read.
+        """
+        wanted = {}
+        for name in names:
+            name = name.strip()
+            if name:
+                wanted.setdefault(tag_key(name), name)
+        if not wanted:
+            return []
+        found = {tag.name_key: tag for tag in self.filter(name_key__in=wanted)}
+        missing = [Tag(name=name, name_key=key) for key, name in wanted.items() if key not in found]
+        if missing:
+            self.bulk_create(missing, ignore_conflicts=True)
+            found.update((tag.name_key, tag) for tag in self.filter(name_key__in=[tag.name_key for tag in missing]))
+        return [found[key] for key in wanted]
 
 
 class Tag(models.Model):
+    # Looked up by name_key, never by name, so only name_key is indexed.
     name = models.CharField(max_length=15)
+    # tag_key(name), set on save: lower() turns 'İ' into two characters.
+    name_key = models.CharField(max_length=30, editable=False)
+    # Number of blogs tagged, maintained by Api.signals and repaired by Api.tasks.reconcile_blog_counters.
+    usage_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TagManager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name_key = tag_key(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        constraints = [
+            # Also serves case-insensitive prefix searches, as a range on name_key.
+            models.UniqueConstraint(fields=['name_key'], name='tag_name_ci_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['-usage_count', 'name'], name='tag_usage_name_idx'),
+        ]
+
+
+class PresetAutoSlugField(AutoSlugField):
+    """
+    AutoSlugField keeping the slug of a new instance flagged with `_slug_preset`, as
+    bulk imports assign unique slugs for a whole chunk up front: autoslug would check
+    each one again, a query per row.
+    """
+
+    def pre_save(self, instance, add):
+        if add and getattr(instance, '_slug_preset', False):
+            return self.value_from_object(instance)
+        return super().pre_save(instance, add)
+
+
+class BlogQuerySet(models.QuerySet):
+    def touch(self, **changes):
+        """
+        update() that also moves `updated`, for changes to what the blogs' representations
+        show besides their own fields (counters, tag names, the author): the conditional GET
+        validators are built from it.
+        """
+        return self.update(updated=timezone.now(), **changes)
+
 
 class Blog(models.Model):
     title = models.CharField(max_length=100, blank=False, null=False)
-    slug = AutoSlugField(populate_from="title", blank=False, null=False, unique=True)
+    slug = PresetAutoSlugField(populate_from="title", blank=False, null=False, unique=True)
     body = models.TextField(blank=False, null=False)
-    author = models.ForeignKey(BlogUser, on_delete=models.CASCADE)
+    # Indexed by blog_author_created_idx, which also serves the ordering.
+    author = models.ForeignKey(BlogUser, on_delete=models.CASCADE, db_index=False)
     category = models.CharField(max_length=100, blank=False, null=False, choices=BLOG_CATEGORIES)
     tags = models.ManyToManyField(Tag)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Denormalized counters, maintained by Api.signals and repaired by Api.tasks.reconcile_blog_counters.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    tag_count = models.PositiveIntegerField(default=0, editable=False)
+    # Derived from body on save, so feeds can defer the body.
+    preview_body = models.TextField(blank=True, default='', editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(default=0, editable=False, help_text='Minutes')
+
+    objects = BlogQuerySet.as_manager()
+
+    PREVIEW_WORDS = 30
+    WORDS_PER_MINUTE = 200
+    DERIVED_FIELDS = ['preview_body', 'word_count', 'reading_time']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded category so cached feeds of a blog's old category get invalidated too.
+        instance._loaded_category = instance.__dict__.get('category')
+        return instance
 
     def __str__(self):
         return self.title
 
-    def preview_body(self):
-        return ' '.join(self.body.split(" ")[:30])
+    def save(self, *args, **kwargs):
+        # A deferred body hasn't changed, and its derived fields are saved as loaded.
+        if 'body' in self.__dict__:
+            self.refresh_derived_fields()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'body' in update_fields:
+                kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        super().save(*args, **kwargs)
+
+    def refresh_derived_fields(self):
+        """
+        Set preview_body, word_count and reading_time from body; bulk writes call this themselves.
+        """
+        self.preview_body = ' '.join(self.body.split(" ", self.PREVIEW_WORDS)[:self.PREVIEW_WORDS])
+        self.word_count = len(self.body.split())
+        self.reading_time = math.ceil(self.word_count / self.WORDS_PER_MINUTE)
 
     class Meta:
         verbose_name = 'Blog'
         verbose_name_plural = 'Blogs'
         ordering = ['-created']
+        # Each list is ordered by ('-created', '-id'); the prefixes match BlogFilter's
+        # category and author filters and the per-author querysets of write actions.
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='blog_created_id_idx'),
+            models.Index(fields=['category', '-created', '-id'], name='blog_category_created_idx'),
+            models.Index(fields=['author', '-created', '-id'], name='blog_author_created_idx'),
+            models.Index(fields=['updated'], name='blog_updated_idx'),
+        ]
 
 
 class Comment(models.Model):
-    user = models.ForeignKey(BlogUser, on_delete=models.CASCADE)
-    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    # Indexed by comment_user_created_idx and comment_blog_created_idx, which also serve the ordering.
+    user = models.ForeignKey(BlogUser, on_delete=models.CASCADE, db_index=False)
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, db_index=False)
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded blog so the counters can follow a comment moved to another blog.
+        instance._loaded_blog_id = instance.__dict__.get('blog_id')
+        return instance
+
     def __str__(self):
         return f"{self.user_id}_{self.blog.id}_{self.id}"
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['blog', 'created', 'id'], name='comment_blog_created_idx'),
+            models.Index(fields=['user', 'created', 'id'], name='comment_user_created_idx'),
+            models.Index(fields=['created', 'id'], name='comment_created_idx'),
+        ]
@@ -0,0 +1,57 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from oauth2_provider.oauth2_validators import OAuth2Validator
+from oauth2_provider.settings import oauth2_settings
+
+
+def get_token_cache():
+    return caches[settings.ACCESS_TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(token_checksum):
+    return f'oauth2:access-token:{token_checksum}'
+
+
+def invalidate_access_tokens(token_checksums):
+    get_token_cache().delete_many([token_cache_key(checksum) for checksum in token_checksums])
+
+
+def invalidate_user_access_tokens(user_id):
+    # Cached tokens carry a copy of their user, which BlogUserViewSet serves as the profile.
+    from oauth2_provider.models import get_access_token_model
+
+    invalidate_access_tokens(
+        get_access_token_model().objects.filter(user_id=user_id).values_list('token_checksum', flat=True)
+    )
+
+
+class CachedOAuth2Validator(OAuth2Validator):
+    """
+    Caches validated access tokens, with their application and user, so a client
+    reusing a token is authenticated without database queries by both
+    OAuth2TokenMiddleware and DRF's OAuth2Authentication.
+
+    Entries live at most ACCESS_TOKEN_CACHE_TIMEOUT seconds and never past the token's
+    expiry. Api.signals drops them when a token is revoked, rotated or changed, or its
+    user is saved; expiry and scopes are still checked on every request.
+    """
+
+    def _load_access_token(self, token):
+        token_checksum = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        cache = get_token_cache()
+        key = token_cache_key(token_checksum)
+        access_token = cache.get(key)
+        if access_token is None:
+            access_token = super()._load_access_token(token)
+            if access_token is not None:
+                timeout = min(
+                    settings.ACCESS_TOKEN_CACHE_TIMEOUT,
+                    oauth2_settings.ACCESS_TOKEN_EXPIRE_SECONDS,
+                    int((access_token.expires - timezone.now()).total_seconds()),
+                )
+                if timeout > 0:
+                    cache.set(key, access_token, timeout=timeout)
+        return access_token
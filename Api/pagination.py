@@ -0,0 +1,272 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class OptionalPaginationMixin:
+    """
+    ?pagination=none turns pagination off: paginate_queryset returns None, and views
+    stream the whole list instead (see Api.streaming).
+    """
+    mode_query_param = 'pagination'
+    unpaginated_mode = 'none'
+
+    def is_disabled(self, request):
+        return request.query_params.get(self.mode_query_param) == self.unpaginated_mode
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed ordering with a unique last field.
+    Each page is one indexed range query of page_size + 1 rows: no COUNT and
+    no OFFSET, so every page costs the same however deep the client scrolls.
+    """
+    ordering = ('-created', '-id')
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return self.set_page([obj async for obj in self.get_page_queryset(queryset, request)])
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The rows of the requested page, plus one to tell whether there is a next page.
+        """
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_seek_filter(self, position):
+        """
+        Rows strictly after `position` in self.ordering, e.g. for ('-created', '-id'):
+        created < c OR (created = c AND id < i)
+        """
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # A .values() row.
+            return [instance[field.lstrip('-')] for field in self.ordering]
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, position):
+        # Not DjangoJSONEncoder: it truncates datetimes to milliseconds, which
+        # would make the seek skip rows created within the same millisecond.
+        position = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        data = json.dumps(position, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.get_position(self.page[-1])))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class CommentKeysetPagination(KeysetPagination):
+    """
+    Oldest first, as comments are read; served by the (blog, created, id) index.
+    """
+    ordering = ('created', 'id')
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination that async views can run on the async ORM: the same COUNT
+    and page queries, awaited.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached_property, so the awaited count is the one it uses.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class TagPagination(OptionalPaginationMixin, PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_disabled(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "none" for all tags, streamed.',
+                'schema': {'type': 'string', 'enum': ['none']},
+            },
+            *super().get_schema_operation_parameters(view),
+        ]
+
+
+class BlogPagination(OptionalPaginationMixin, BasePagination):
+    """
+    Page numbers by default; keyset pagination (newest first) when the client
+    passes ?pagination=cursor or a cursor from a previous page; none with
+    ?pagination=none.
+    """
+
+    def __init__(self):
+        self.page_number = AsyncPageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.active = self.page_number
+
+    def get_paginator(self, request):
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.keyset.cursor_query_param in request.query_params):
+            return self.keyset
+        return self.page_number
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The page's rows in keyset mode, where they are cheap to compute up front;
+        None in page-number mode.
+        """
+        if self.get_paginator(request) is self.keyset and not self.is_disabled(request):
+            return self.keyset.get_page_queryset(queryset, request)
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_disabled(request):
+            return None
+        self.active = self.get_paginator(request)
+        return self.active.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.is_disabled(request):
+            return None
+        self.active = self.get_paginator(request)
+        return await self.active.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" for keyset pagination, or to "none" for all blogs, streamed.',
+                'schema': {'type': 'string', 'enum': ['cursor', 'none']},
+            },
+            *self.page_number.get_schema_operation_parameters(view),
+            *self.keyset.get_schema_operation_parameters(view),
+        ]
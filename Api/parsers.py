@@ -0,0 +1,79 @@
+import codecs
+import json
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.json import strict_constant
+
+# Beyond 64 bits, orjson reads integers as floats; json keeps them exact.
+LARGEST_INTEGER = 2 ** 63
+
+
+def has_large_float(value):
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, float) and abs(value) >= LARGEST_INTEGER:
+            return True
+    return False
+
+
+def loads(data, encoding):
+    """
+    Parse UTF-8 JSON bytes with orjson, and other encodings with json; documents that
+    orjson may have read differently are parsed again with json. Like a strict
+    JSONParser, both reject NaN and Infinity.
+    """
+    if codecs.lookup(encoding).name == 'utf-8':
+        value = orjson.loads(data)
+        if not has_large_float(value):
+            return value
+    return json.loads(data.decode(encoding), parse_constant=strict_constant)
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser parsing with orjson.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return loads(stream.read(), encoding)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON. Parsing is lazy: request.data is an iterator of
+    (line number, object or error message) read from the request stream one
+    line at a time, so large uploads are never held in memory.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_lines(stream, encoding)
+
+    def iter_lines(self, stream, encoding):
+        if stream is None:
+            return
+        for line_number, line in enumerate(iter(stream.readline, b''), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, loads(line, encoding)
+            except ValueError as exc:
+                yield line_number, f'Invalid JSON: {exc}'
@@ -9,7 +9,8 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.author == request.user
+        # Ids, not obj.author: loading the author is a query, which async views can't run inline.
+        return obj.author_id == request.user.pk
 
 
 class IsUserOrReadOnly(permissions.BasePermission):
@@ -20,7 +21,7 @@ class IsUserOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 
 class IsSelfOrReadOnly(permissions.BasePermission):
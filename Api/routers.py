@@ -0,0 +1,102 @@
+"""
+Read-replica routing. ReadReplicaMiddleware picks the database for a request's reads;
+everything else (writes, unsafe requests, Celery tasks, management commands) uses the
+primary.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY = 'default'
+
+# Alias of the replica the current request reads from, None for the primary.
+read_database = ContextVar('read_database', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def choose_replica():
+    replicas = get_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, e.g. to compute data that outlives the request.
+    """
+    token = read_database.set(None)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def get_pin_cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+def get_client_key(request):
+    """
+    Who made the request, without touching the database: the credentials it carries,
+    else its session, else its address.
+    """
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if credentials:
+        return hashlib.sha256(credentials.encode()).hexdigest()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def pin_key(client_key):
+    return f'replica-pin:{client_key}'
+
+
+def pin_to_primary(client_key):
+    """
+    Route the client's reads to the primary for REPLICA_PIN_SECONDS, so it reads its
+    own writes while the replicas catch up.
+    """
+    get_pin_cache().set(pin_key(client_key), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+async def apin_to_primary(client_key):
+    await get_pin_cache().aset(pin_key(client_key), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(client_key):
+    return bool(get_pin_cache().get(pin_key(client_key)))
+
+
+async def ais_pinned(client_key):
+    return bool(await get_pin_cache().aget(pin_key(client_key)))
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request and all writes to the
+    primary. Apps in REPLICA_EXCLUDED_APPS are always read from the primary: an OAuth2
+    token or session has to work on the very next request, before it has replicated.
+    """
+
+    def db_for_read(self, model, **hints):
+        database = read_database.get()
+        if database is None or model._meta.app_label in settings.REPLICA_EXCLUDED_APPS:
+            return PRIMARY
+        return database
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema by replication.
+        return db not in get_replicas()
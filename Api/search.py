@@ -0,0 +1,204 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from Api.models import Blog
+
+SEARCH_TABLE = 'api_blog_search'
+
+
+class BaseSearchBackend:
+    """
+    Keeps a full-text index of blogs in a side table next to the Blog table
+    and answers BlogFilter's ?search= queries from it.
+    """
+
+    def create_index(self, connection):
+        pass
+
+    def drop_index(self, connection):
+        pass
+
+    def clear(self, connection):
+        pass
+
+    def index_rows(self, connection, rows):
+        """
+        Add or replace index entries for (id, title, body, author username) rows.
+        """
+        pass
+
+    def remove(self, connection, blog_ids):
+        pass
+
+    def search(self, queryset, value):
+        raise NotImplementedError
+
+    def index_blogs(self, blog_ids):
+        rows = Blog.objects.filter(pk__in=blog_ids).values_list('id', 'title', 'body', 'author__username')
+        self.index_rows(get_write_connection(), list(rows))
+
+    def rebuild(self, chunk_size=500):
+        connection = get_write_connection()
+        self.create_index(connection)
+        self.clear(connection)
+        rows = Blog.objects.order_by().values_list('id', 'title', 'body', 'author__username')
+        count = 0
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self.index_rows(connection, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            self.index_rows(connection, chunk)
+            count += len(chunk)
+        return count
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without a full-text engine: unindexed LIKE scans.
+    """
+
+    def search(self, queryset, value):
+        return queryset.filter(
+            Q(title__icontains=value) |
+            Q(body__icontains=value) |
+            Q(author__username__icontains=value)
+        ).distinct()
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    SQLite FTS5 virtual table keyed by blog id (rowid), ranked with bm25.
+    Title and author matches weigh more than body matches.
+    """
+
+    def create_index(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5(title, body, author, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')"
+            )
+
+    def drop_index(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def index_rows(self, connection, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE}(rowid, title, body, author) VALUES (%s, %s, %s, %s)", rows
+            )
+
+    def remove(self, connection, blog_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(pk,) for pk in blog_ids])
+
+    def search(self, queryset, value):
+        terms = re.findall(r'\w+', value)
+        if not terms:
+            return queryset.none()
+        # Every term must match, each as a token prefix: "djan" finds "django".
+        match = ' '.join('"%s"*' % term for term in terms)
+        blog_table = connections[queryset.db].ops.quote_name(Blog._meta.db_table)
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.rowid = {blog_table}.id", f"{SEARCH_TABLE} MATCH %s"],
+            params=[match],
+            select={'search_rank': f"{SEARCH_TABLE}.rank"},
+        ).order_by('search_rank', *Blog._meta.ordering)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL tsvector column with a GIN index, ranked with ts_rank.
+    """
+    config = 'english'
+
+    def create_index(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"(blog_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin(document)"
+            )
+
+    def drop_index(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def clear(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {SEARCH_TABLE}")
+
+    def index_rows(self, connection, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE}(blog_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'C') || "
+                f"setweight(to_tsvector('simple', %s), 'B')) "
+                f"ON CONFLICT (blog_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+    def remove(self, connection, blog_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE blog_id = ANY(%s)", [list(blog_ids)])
+
+    def search(self, queryset, value):
+        blog_table = connections[queryset.db].ops.quote_name(Blog._meta.db_table)
+        tsquery = f"websearch_to_tsquery('{self.config}', %s)"
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.blog_id = {blog_table}.id", f"{SEARCH_TABLE}.document @@ {tsquery}"],
+            params=[value],
+            select={'search_rank': f"ts_rank({SEARCH_TABLE}.document, {tsquery})"},
+            select_params=[value],
+        ).order_by('-search_rank', *Blog._meta.ordering)
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend_class(vendor):
+    path = getattr(settings, 'BLOG_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)
+    return VENDOR_BACKENDS.get(vendor, IContainsSearchBackend)
+
+
+def get_write_connection():
+    return connections[router.db_for_write(Blog)]
+
+
+def get_backend(connection=None):
+    connection = connection or get_write_connection()
+    return get_backend_class(connection.vendor)()
+
+
+def search(queryset, value):
+    return get_backend(connections[queryset.db]).search(queryset, value)
@@ -1,11 +1,32 @@
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnList
 
 from Api.models import Blog, Tag, Comment, BlogUser
 
 
+class ProfileThumbnailField(serializers.ImageField):
+    """
+    URL of a user's profile thumbnail in `image_format`, or of the original picture
+    until the thumbnail has been generated.
+    """
+
+    def __init__(self, image_format='webp', **kwargs):
+        self.image_format = image_format
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user):
+        thumbnail = getattr(user, f'thumbnail_{self.image_format}')
+        return super().to_representation(thumbnail or user.profile_picture)
+
+
 class BlogUserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.ImageField(max_length=30, allow_empty_file=False, use_url=True)
     bio = serializers.CharField(allow_blank=True, allow_null=True, required=False)
+    profile_thumbnail = ProfileThumbnailField(source='*', use_url=True)
+    profile_thumbnail_jpeg = ProfileThumbnailField('jpeg', source='*', use_url=True)
 
     def create(self, validated_data):
         blog_user = BlogUser(
@@ -21,7 +42,8 @@ class BlogUserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BlogUser
-        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'password']
+        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'profile_thumbnail',
+                  'profile_thumbnail_jpeg', 'password']
         read_only_fields = ['id']
         extra_kwargs = {'password': {'write_only': True}}
 
@@ -41,7 +63,8 @@ class PreviewBlogSerializer(serializers.ModelSerializer):
         read_only=True,
         use_url=True
     )
-    preview_body = serializers.CharField(read_only=True)
+    profile_thumbnail = ProfileThumbnailField(source='author', use_url=True)
+    profile_thumbnail_jpeg = ProfileThumbnailField('jpeg', source='author', use_url=True)
 
     class Meta:
         model = Blog
@@ -49,21 +72,26 @@ class PreviewBlogSerializer(serializers.ModelSerializer):
 
 
 class BlogSerializer(serializers.ModelSerializer):
-    tags = serializers.StringRelatedField(many=True)
-    tag_names = serializers.ListField(child=serializers.CharField(), write_only=True, required=False)
+    tags = serializers.StringRelatedField(many=True, read_only=True)
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=Tag._meta.get_field('name').max_length),
+        write_only=True,
+        required=False
+    )
     author = serializers.StringRelatedField(read_only=True)
     profile_picture = serializers.ImageField(
         source='author.profile_picture',
         read_only=True,
         use_url=True
     )
+    profile_thumbnail = ProfileThumbnailField(source='author', use_url=True)
+    profile_thumbnail_jpeg = ProfileThumbnailField('jpeg', source='author', use_url=True)
 
     def create(self, validated_data):
         tag_names = validated_data.pop('tag_names', [])
         validated_data.pop('tags', None)
         blog = Blog.objects.create(**validated_data)
-        tags = [Tag.objects.get_or_create(name=tag)[0] for tag in tag_names]
-        blog.tags.set(tags)
+        blog.tags.set(Tag.objects.resolve(tag_names))
         return blog
 
     def update(self, instance, validated_data):
@@ -72,8 +100,7 @@ class BlogSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         if tag_names:
-            tags = [Tag.objects.get_or_create(name=tag)[0] for tag in tag_names]
-            instance.tags.set(tags)
+            instance.tags.set(Tag.objects.resolve(tag_names))
         return instance
 
     class Meta:
@@ -82,6 +109,153 @@ class BlogSerializer(serializers.ModelSerializer):
         read_only_fields = ['author', 'created', 'slug', 'profile_picture']
 
 
+class BlogValuesSerializer:
+    """
+    Read-only, many=True stand-in for `serializer_class` that gives the same data from
+    .values() rows (see values_queryset): the page's columns in one query and its tag
+    names in another, without model instances or per-field serializer calls. Media URLs
+    are the file name appended to the storage's URL prefix, made absolute once.
+    """
+    serializer_class = BlogSerializer
+    author_columns = {
+        'author': 'author__username',
+        'profile_picture': 'author__profile_picture',
+        'profile_thumbnail': 'author__thumbnail_webp',
+        'profile_thumbnail_jpeg': 'author__thumbnail_jpeg',
+    }
+    # Readable fields without a Blog attribute, which serializer_class leaves out.
+    skipped_fields = {'tag_names'}
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def get_fields(cls):
+        """
+        {name: field} of the fields in serializer_class's output, in its order.
+        """
+        if cls.__dict__.get('_fields') is None:
+            fields = cls.serializer_class().fields
+            cls._fields = {
+                name: field for name, field in fields.items()
+                if not field.write_only and name not in cls.skipped_fields
+            }
+        return cls._fields
+
+    @classmethod
+    def get_value_names(cls):
+        names = []
+        for name in cls.get_fields():
+            if name in cls.author_columns:
+                names.append(cls.author_columns[name])
+            elif name != 'tags':
+                names.append(name)
+        # The thumbnails fall back to the picture.
+        if {'profile_thumbnail', 'profile_thumbnail_jpeg'} & cls.get_fields().keys():
+            names.append('author__profile_picture')
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        return queryset.prefetch_related(None).values(*cls.get_value_names())
+
+    def get_tag_names(self, rows):
+        """
+        {blog id: [tag names]}, in the order a prefetch of the tags loads them.
+        """
+        tag_names = {row['id']: [] for row in rows}
+        if 'tags' in self.get_fields() and tag_names:
+            for blog_id, name in Tag.objects.filter(blog__in=list(tag_names)).values_list('blog__id', 'name'):
+                tag_names[blog_id].append(name)
+        return tag_names
+
+    def get_media_url(self):
+        """
+        A function of a file name to the URL the serializer's ImageFields give for it.
+        """
+        storage = BlogUser._meta.get_field('profile_picture').storage
+        request = self.context.get('request')
+        if getattr(storage.url, '__func__', None) is FileSystemStorage.url:
+            prefix = storage.base_url
+            if request is not None:
+                prefix = request.build_absolute_uri(prefix)
+
+            def media_url(name):
+                return prefix + filepath_to_uri(name).lstrip('/') if name else None
+        else:
+            def media_url(name):
+                if not name:
+                    return None
+                url = storage.url(name)
+                return request.build_absolute_uri(url) if request is not None else url
+        return media_url
+
+    def get_getters(self):
+        media_url = self.get_media_url()
+        getters = {
+            'author': lambda row, tags: str(row['author__username']),
+            'profile_picture': lambda row, tags: media_url(row['author__profile_picture']),
+            'profile_thumbnail': lambda row, tags: media_url(
+                row['author__thumbnail_webp'] or row['author__profile_picture']
+            ),
+            'profile_thumbnail_jpeg': lambda row, tags: media_url(
+                row['author__thumbnail_jpeg'] or row['author__profile_picture']
+            ),
+            'tags': lambda row, tags: tags[row['id']],
+        }
+        for name, field in self.get_fields().items():
+            if name in getters:
+                continue
+            if isinstance(field, (serializers.DateTimeField, serializers.DateField)):
+                getters[name] = lambda row, tags, name=name, field=field: field.to_representation(row[name])
+            else:
+                # Text, number and choice fields give their column's value as loaded.
+                getters[name] = lambda row, tags, name=name: row[name]
+        return [(name, getters[name]) for name in self.get_fields()]
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        tags = self.get_tag_names(rows)
+        getters = self.get_getters()
+        return ReturnList([{name: get(row, tags) for name, get in getters} for row in rows], serializer=self)
+
+
+class PreviewBlogValuesSerializer(BlogValuesSerializer):
+    serializer_class = PreviewBlogSerializer
+
+
+class BlogExportSerializer(serializers.ModelSerializer):
+    """
+    One line of a bulk export; its output is accepted back by the bulk import.
+    """
+    tag_names = serializers.SerializerMethodField()
+    author = serializers.StringRelatedField(read_only=True)
+
+    def get_tag_names(self, blog):
+        return [tag.name for tag in blog.tags.all()]
+
+    class Meta:
+        model = Blog
+        fields = ['slug', 'title', 'body', 'category', 'tag_names', 'author', 'created', 'updated']
+
+
+class BlogCommentSerializer(serializers.ModelSerializer):
+    """
+    A comment under its blog, with what is shown next to it of the commenter.
+    """
+    username = serializers.CharField(source='user.username', read_only=True)
+    profile_thumbnail = ProfileThumbnailField(source='user', use_url=True)
+    profile_thumbnail_jpeg = ProfileThumbnailField('jpeg', source='user', use_url=True)
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'user', 'username', 'profile_thumbnail', 'profile_thumbnail_jpeg', 'text', 'created',
+                  'updated']
+        read_only_fields = fields
+
+
 class CommentSerializer(serializers.ModelSerializer):
     blog = serializers.PrimaryKeyRelatedField(queryset=Blog.objects.none())
 
@@ -0,0 +1,329 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from oauth2_provider.models import get_access_token_model
+
+from Api.cache import invalidate_previews, refresh_top_tags
+from Api.models import Blog, BlogUser, Comment, Tag
+from Api.oauth import invalidate_access_tokens, invalidate_user_access_tokens
+from Api.search import get_backend, get_write_connection
+from Api.thumbnails import THUMBNAIL_FORMATS, delete_thumbnail_files, enqueue_thumbnails
+
+
+@receiver(post_save, sender=Blog)
+def index_blog(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_backend().index_rows(
+        get_write_connection(),
+        [(instance.pk, instance.title, instance.body, instance.author.username)]
+    )
+
+
+@receiver(post_delete, sender=Blog)
+def unindex_blog(sender, instance, **kwargs):
+    get_backend().remove(get_write_connection(), [instance.pk])
+
+
+@receiver(post_save, sender=BlogUser)
+def reindex_author_blogs(sender, instance, created=False, raw=False, **kwargs):
+    """
+    The author username is indexed with every blog, so re-index them when it changed.
+    """
+    if raw or created or not instance.display_fields_changed(['username']):
+        return
+    blog_ids = list(Blog.objects.filter(author=instance).values_list('id', flat=True))
+    if blog_ids:
+        get_backend().index_blogs(blog_ids)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    loaded_blog_id = getattr(instance, '_loaded_blog_id', None)
+    if created:
+        Blog.objects.filter(pk=instance.blog_id).touch(comment_count=F('comment_count') + 1)
+    elif loaded_blog_id is not None and loaded_blog_id != instance.blog_id:
+        Blog.objects.filter(pk=loaded_blog_id, comment_count__gt=0).touch(comment_count=F('comment_count') - 1)
+        Blog.objects.filter(pk=instance.blog_id).touch(comment_count=F('comment_count') + 1)
+    instance._loaded_blog_id = instance.blog_id
+
+
+def deleted_with(origin, model):
+    """
+    Whether the delete that sent a signal started from `model` rows, an instance or a queryset.
+    """
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, model)
+    return isinstance(origin, model)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Deleting a blog cascades to its comments: no count left to keep. Deleting a user
+    # cascades to theirs, which uncount_deleted_user_comments counted in one UPDATE.
+    if deleted_with(origin, (Blog, BlogUser)):
+        return
+    Blog.objects.filter(pk=instance.blog_id, comment_count__gt=0).touch(comment_count=F('comment_count') - 1)
+
+
+@receiver(pre_delete, sender=BlogUser)
+def uncount_deleted_user_comments(sender, instance, **kwargs):
+    """
+    Take the comments of a deleted user off the counts of the blogs they commented on.
+    """
+    user_comments = Comment.objects.filter(blog=OuterRef('pk'), user=instance).order_by().values('blog').annotate(
+        count=Count('*')
+    ).values('count')
+    Blog.objects.filter(pk__in=Comment.objects.filter(user=instance).values('blog_id')).touch(
+        comment_count=F('comment_count') - Subquery(user_comments)
+    )
+
+
+def recount_tags(blog_ids):
+    """
+    Recount tags for the given blogs in a single UPDATE, so concurrent tag edits can't lose increments.
+    """
+    tag_counts = Blog.tags.through.objects.filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+    Blog.objects.filter(pk__in=blog_ids).touch(tag_count=Coalesce(Subquery(tag_counts), 0))
+
+
+@receiver(m2m_changed, sender=Blog.tags.through)
+def count_blog_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_blog_ids = list(instance.blog_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recount_tags([instance.pk])
+        elif action == 'post_clear':
+            recount_tags(instance.__dict__.pop('_cleared_blog_ids', []))
+        elif pk_set:
+            recount_tags(pk_set)
+
+
+def recount_tag_usage(tag_ids):
+    """
+    Recount the blogs of the given tags in a single UPDATE, and fold them into the
+    cached top tags once committed. A full count per tag, so only for bulk loads.
+    """
+    tag_ids = list(tag_ids)
+    usage_counts = Blog.tags.through.objects.filter(
+        tag=OuterRef('pk')
+    ).order_by().values('tag').annotate(count=Count('*')).values('count')
+    Tag.objects.filter(pk__in=tag_ids).update(usage_count=Coalesce(Subquery(usage_counts), 0))
+    refresh_top_tags(tag_ids)
+
+
+def adjust_tag_usage(tag_ids, delta):
+    """
+    Add `delta` to the usage counts of the given tags in a single UPDATE, never going
+    below zero, and fold them into the cached top tags once committed. Like
+    comment_count, the counts are kept by increments, whatever a tag's popularity;
+    Api.tasks.reconcile_blog_counters repairs drift.
+    """
+    tag_ids = list(tag_ids)
+    if not tag_ids or not delta:
+        return
+    Tag.objects.filter(pk__in=tag_ids).update(usage_count=Greatest(F('usage_count') + delta, 0))
+    refresh_top_tags(tag_ids)
+
+
+@receiver(m2m_changed, sender=Blog.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    # remove() reports the pks it was given, linked or not: set() only gives linked ones,
+    # and reconcile_blog_counters repairs what removing unlinked ones takes off.
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_link_count = instance.blog_set.count()
+        else:
+            instance._cleared_tag_ids = list(instance.tags.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            adjust_tag_usage([instance.pk], delta * len(pk_set))
+        else:
+            adjust_tag_usage(pk_set, delta)
+    elif action == 'post_clear':
+        if reverse:
+            adjust_tag_usage([instance.pk], -instance.__dict__.pop('_cleared_link_count', 0))
+        else:
+            adjust_tag_usage(instance.__dict__.pop('_cleared_tag_ids', []), -1)
+
+
+@receiver(pre_delete, sender=Blog)
+def remember_blog_tags(sender, instance, **kwargs):
+    # The cascade deletes the blog's tag links without m2m_changed; prefetched tags save the query.
+    instance._deleted_tag_ids = [tag.pk for tag in instance.tags.all()]
+
+
+@receiver(post_delete, sender=Blog)
+def count_deleted_blog_tags(sender, instance, **kwargs):
+    adjust_tag_usage(instance.__dict__.pop('_deleted_tag_ids', []), -1)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_blogs(sender, instance, **kwargs):
+    instance._tagged_blog_ids = list(instance.blog_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def count_deleted_tag(sender, instance, **kwargs):
+    blog_ids = instance.__dict__.pop('_tagged_blog_ids', [])
+    if blog_ids:
+        recount_tags(blog_ids)
+    refresh_top_tags([instance.pk])
+
+
+@receiver(post_save, sender=Blog)
+def invalidate_saved_blog(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_previews({instance.category, getattr(instance, '_loaded_category', None)})
+    instance._loaded_category = instance.category
+
+
+@receiver(post_delete, sender=Blog)
+def invalidate_deleted_blog(sender, instance, **kwargs):
+    invalidate_previews({instance.category})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_blog(sender, instance, raw=False, origin=None, **kwargs):
+    # Cascades from a deleted blog or user invalidate once, in invalidate_deleted_blog
+    # and invalidate_deleted_user_comments.
+    if raw or deleted_with(origin, (Blog, BlogUser)):
+        return
+    # comment_count is part of every preview card.
+    invalidate_previews(Blog.objects.filter(
+        pk__in={instance.blog_id, getattr(instance, '_loaded_blog_id', None)}
+    ).values_list('category', flat=True))
+
+
+@receiver(pre_delete, sender=BlogUser)
+def invalidate_deleted_user_comments(sender, instance, **kwargs):
+    invalidate_previews(Blog.objects.filter(
+        pk__in=Comment.objects.filter(user=instance).values('blog_id')
+    ).order_by().values_list('category', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=Blog.tags.through)
+def invalidate_tagged_blogs(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_previews({instance.category})
+    else:
+        invalidate_previews(Blog.objects.filter(pk__in=pk_set or []).values_list('category', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_renamed_tag(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    refresh_top_tags([instance.pk])
+    Blog.objects.filter(tags=instance).touch()
+    invalidate_previews(instance.blog_set.order_by().values_list('category', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Tag)
+def invalidate_deleted_tag(sender, instance, **kwargs):
+    invalidate_previews(instance.blog_set.order_by().values_list('category', flat=True).distinct())
+
+
+@receiver(post_save, sender=BlogUser)
+def invalidate_author_blogs(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Preview cards show the author's username and profile picture.
+    """
+    if raw or created or not instance.display_fields_changed(BlogUser.DISPLAY_FIELDS):
+        return
+    Blog.objects.filter(author=instance).touch()
+    invalidate_previews(Blog.objects.filter(author=instance).order_by().values_list('category', flat=True).distinct())
+
+
+AccessToken = get_access_token_model()
+
+
+@receiver(pre_save, sender=AccessToken)
+def invalidate_changed_access_token(sender, instance, raw=False, **kwargs):
+    """
+    Refreshing without rotation rewrites the token of an existing row.
+    """
+    if raw or instance.pk is None:
+        return
+    invalidate_access_tokens(
+        AccessToken.objects.filter(pk=instance.pk).values_list('token_checksum', flat=True)
+    )
+
+
+@receiver(post_delete, sender=AccessToken)
+def invalidate_revoked_access_token(sender, instance, **kwargs):
+    # Revoking an access token, directly or through its rotated refresh token, deletes it.
+    invalidate_access_tokens([instance.token_checksum])
+
+
+@receiver(post_save, sender=BlogUser)
+def invalidate_saved_user_access_tokens(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    invalidate_user_access_tokens(instance.pk)
+
+
+THUMBNAIL_FIELDS = [field_name for field_name, _, _ in THUMBNAIL_FORMATS.values()]
+
+
+@receiver(pre_save, sender=BlogUser)
+def reset_profile_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Blank the thumbnails of a replaced picture, remembering their files for deletion;
+    until the new picture's thumbnails are ready, cards fall back to the picture itself.
+    """
+    instance._picture_changed = False
+    instance._stale_thumbnails = {}
+    if raw or (update_fields is not None and 'profile_picture' not in update_fields):
+        return
+    if instance.pk is None:
+        instance._picture_changed = bool(instance.profile_picture)
+        return
+    saves_thumbnails = update_fields is None or set(THUMBNAIL_FIELDS) <= set(update_fields)
+    current = BlogUser.objects.filter(pk=instance.pk).values('profile_picture', *THUMBNAIL_FIELDS)
+    if not instance.display_fields_changed(['profile_picture']):
+        blank = saves_thumbnails and not all(getattr(instance, field) for field in THUMBNAIL_FIELDS)
+        if blank and instance.profile_picture:
+            # A copy loaded before its thumbnails were made keeps them rather than blanking them.
+            saved = current.filter(profile_picture=instance.profile_picture.name).first()
+            if saved:
+                for field in THUMBNAIL_FIELDS:
+                    setattr(instance, field, saved[field])
+        return
+    instance._picture_changed = bool(instance.profile_picture)
+    if saves_thumbnails:
+        saved = current.first() or {}
+        instance._stale_thumbnails = {field: saved[field] for field in THUMBNAIL_FIELDS if saved.get(field)}
+        for field in THUMBNAIL_FIELDS:
+            setattr(instance, field, '')
+
+
+@receiver(post_save, sender=BlogUser)
+def queue_profile_thumbnails(sender, instance, raw=False, **kwargs):
+    # Only a new picture needs thumbnails; backfill_thumbnails retries the ones that failed.
+    stale, instance._stale_thumbnails = getattr(instance, '_stale_thumbnails', {}), {}
+    if stale:
+        transaction.on_commit(lambda: delete_thumbnail_files(stale))
+    if raw or not getattr(instance, '_picture_changed', False):
+        return
+    instance._picture_changed = False
+    user_id = instance.pk
+    transaction.on_commit(lambda: enqueue_thumbnails(user_id))
+
+
+@receiver(post_save, sender=BlogUser)
+def remember_author_fields(sender, instance, **kwargs):
+    # Connected last, so it runs after the receivers above have compared the fields.
+    instance.remember_display_fields()
@@ -0,0 +1,89 @@
+"""
+JSON arrays written to the response a chunk of rows at a time, for lists served
+without pagination: memory and the time to the first byte stay the same however
+many rows there are.
+"""
+import contextvars
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from Api.renderers import FastJSONRenderer
+
+STREAM_CHUNK_SIZE = 500
+
+
+def iter_chunks(queryset, size=None):
+    """
+    Lists of up to `size` (default STREAM_CHUNK_SIZE) rows of `queryset`, read through
+    a chunked cursor.
+    """
+    size = size or STREAM_CHUNK_SIZE
+    rows = queryset.iterator(chunk_size=size)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def stream_json_array(chunks):
+    """
+    Yield the JSON array of the items of `chunks`, lists of serialized items, one
+    rendered chunk at a time: the same bytes as rendering the whole list at once.
+    """
+    renderer = FastJSONRenderer()
+    yield b'['
+    separator = b''
+    for chunk in chunks:
+        if chunk:
+            # The chunk's items without its brackets.
+            yield separator + renderer.render(chunk)[1:-1]
+            separator = b','
+    yield b']'
+
+
+async def aiterate(iterator):
+    """
+    Iterate a sync iterator in the thread sync views run in, a step at a time.
+    """
+    get_next = sync_to_async(next)
+    try:
+        while (item := await get_next(iterator, None)) is not None:
+            yield item
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+def in_request_context(iterator):
+    """
+    Run each step of `iterator` in the context of the request that created it. A body is
+    read after the middleware have returned and reset the request's context variables,
+    so its queries would go to the primary and miss the request's query timer.
+    """
+    context = contextvars.copy_context()
+    iterator = iter(iterator)
+
+    def steps():
+        try:
+            while True:
+                try:
+                    yield context.run(next, iterator)
+                except StopIteration:
+                    return
+        finally:
+            if hasattr(iterator, 'close'):
+                context.run(iterator.close)
+
+    return steps()
+
+
+def streaming_json_response(request, chunks):
+    """
+    A StreamingHttpResponse of stream_json_array(chunks), read in the request's context.
+    Under ASGI the array is produced through aiterate: Django reads a sync iterator to
+    the end before sending any of it there.
+    """
+    content = in_request_context(stream_json_array(chunks))
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        content = aiterate(content)
+    return StreamingHttpResponse(content, content_type='application/json')
@@ -1,8 +1,162 @@
+import json
+import logging
+import time
+
 from celery import shared_task
 
+logger = logging.getLogger(__name__)
+
+
+def expired_token_stages():
+    """
+    (name, queryset) pairs of what oauth2_provider.models.clear_expired deletes, in its order.
+    """
+    from datetime import timedelta
+
+    from django.utils import timezone
+    from oauth2_provider.models import (
+        get_access_token_model, get_refresh_token_model, get_id_token_model, get_grant_model
+    )
+    from oauth2_provider.settings import oauth2_settings
+
+    now = timezone.now()
+    RefreshToken = get_refresh_token_model()
+    stages = []
+    refresh_expire_seconds = oauth2_settings.REFRESH_TOKEN_EXPIRE_SECONDS
+    if refresh_expire_seconds:
+        if not isinstance(refresh_expire_seconds, timedelta):
+            refresh_expire_seconds = timedelta(seconds=refresh_expire_seconds)
+        refresh_expire_at = now - refresh_expire_seconds
+        stages += [
+            ('revoked_refresh_tokens', RefreshToken.objects.filter(revoked__lt=refresh_expire_at)),
+            ('expired_refresh_tokens', RefreshToken.objects.filter(access_token__expires__lt=refresh_expire_at)),
+        ]
+    stages += [
+        ('access_tokens', get_access_token_model().objects.filter(refresh_token__isnull=True, expires__lt=now)),
+        ('id_tokens', get_id_token_model().objects.filter(access_token__isnull=True, expires__lt=now)),
+        ('grants', get_grant_model().objects.filter(expires__lt=now)),
+    ]
+    return stages
+
+
+@shared_task(bind=True)
+def clear_tokens(self, stage=0, last_pk=0, deleted=None, max_seconds=None):
+    """
+    Delete expired OAuth2 tokens like clear_expired(), but in primary-key ordered
+    batches of CLEAR_EXPIRED_TOKENS_BATCH_SIZE rows, each in its own short
+    transaction, with CLEAR_EXPIRED_TOKENS_BATCH_INTERVAL seconds between them so
+    API writes are never locked out for long.
+
+    After TOKEN_PURGE_MAX_SECONDS the task re-queues itself from where it stopped.
+    Committed batches stay deleted, so an interrupted run loses no work either.
+    Returns and logs the rows deleted per stage and the duration.
+    """
+    from django.conf import settings
+    from django.db import transaction
+    from oauth2_provider.settings import oauth2_settings
+
+    batch_size = oauth2_settings.CLEAR_EXPIRED_TOKENS_BATCH_SIZE
+    interval = oauth2_settings.CLEAR_EXPIRED_TOKENS_BATCH_INTERVAL
+    if max_seconds is None:
+        max_seconds = settings.TOKEN_PURGE_MAX_SECONDS
+    deleted = deleted or {}
+    start = time.monotonic()
+    stages = expired_token_stages()
+
+    while stage < len(stages):
+        name, queryset = stages[stage]
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            stage, last_pk = stage + 1, 0
+            continue
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=pks).delete()
+        deleted[name] = deleted.get(name, 0) + len(pks)
+        last_pk = pks[-1]
+        if max_seconds and time.monotonic() - start > max_seconds:
+            self.apply_async(kwargs={'stage': stage, 'last_pk': last_pk, 'deleted': deleted})
+            break
+        if interval:
+            time.sleep(interval)
+
+    metrics = {
+        'deleted': deleted,
+        'total_deleted': sum(deleted.values()),
+        'duration_seconds': round(time.monotonic() - start, 3),
+        'finished': stage >= len(stages),
+    }
+    logger.info(json.dumps({'task': 'clear_tokens', **metrics}))
+    return metrics
+
+
+@shared_task
+def reconcile_blog_counters(chunk_size=1000):
+    """
+    Repair drift in Blog.comment_count, Blog.tag_count and Tag.usage_count (bulk writes,
+    raw SQL, crashes between statements) one primary-key range at a time. Returns the
+    number of blogs and tags fixed.
+    """
+    from django.db.models import Count, F, OuterRef, Q, Subquery
+    from django.db.models.functions import Coalesce
+
+    from Api.cache import get_cache, TOP_TAGS_KEY
+    from Api.models import Blog, Comment, Tag
+
+    comment_counts = Comment.objects.filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+    tag_counts = Blog.tags.through.objects.filter(
+        blog=OuterRef('pk')
+    ).order_by().values('blog').annotate(count=Count('*')).values('count')
+
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(Blog.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        drifted = list(Blog.objects.filter(pk__in=pks).annotate(
+            actual_comments=Coalesce(Subquery(comment_counts), 0),
+            actual_tags=Coalesce(Subquery(tag_counts), 0),
+        ).exclude(
+            Q(comment_count=F('actual_comments')) & Q(tag_count=F('actual_tags'))
+        ).values_list('pk', flat=True))
+        if drifted:
+            fixed += Blog.objects.filter(pk__in=drifted).touch(
+                comment_count=Coalesce(Subquery(comment_counts), 0),
+                tag_count=Coalesce(Subquery(tag_counts), 0),
+            )
+
+    usage_counts = Blog.tags.through.objects.filter(
+        tag=OuterRef('pk')
+    ).order_by().values('tag').annotate(count=Count('*')).values('count')
+    fixed_tags = 0
+    last_pk = 0
+    while True:
+        pks = list(Tag.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        drifted = list(Tag.objects.filter(pk__in=pks).annotate(
+            actual_usage=Coalesce(Subquery(usage_counts), 0),
+        ).exclude(usage_count=F('actual_usage')).values_list('pk', flat=True))
+        if drifted:
+            fixed_tags += Tag.objects.filter(pk__in=drifted).update(usage_count=Coalesce(Subquery(usage_counts), 0))
+    if fixed_tags:
+        get_cache().delete(TOP_TAGS_KEY)
+    return fixed + fixed_tags
+
 
 @shared_task
-def clear_tokens():
-    from oauth2_provider.models import clear_expired
+def generate_profile_thumbnails(user_id):
+    """
+    Make the WebP and JPEG thumbnails of a user's current profile picture.
+    """
+    from Api.models import BlogUser
+    from Api.thumbnails import generate_thumbnails
 
-    clear_expired()
+    user = BlogUser.objects.filter(pk=user_id).only('profile_picture').first()
+    if user is None or not user.profile_picture:
+        return False
+    return generate_thumbnails(user)
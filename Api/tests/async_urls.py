@@ -0,0 +1,13 @@
+"""
+URLconf of AsyncViewTests: the read viewsets as ASGI serves them. Views are made sync
+or async when they are routed, so it must first be loaded with ASYNC_VIEWS on, as the
+tests that use it set.
+"""
+from rest_framework.routers import SimpleRouter
+
+from Api.viewsets import BlogViewSet, CommentViewSet
+
+router = SimpleRouter()
+router.register(r'blogs', BlogViewSet, basename='blog')
+router.register(r'comments', CommentViewSet, basename='comment')
+urlpatterns = router.urls
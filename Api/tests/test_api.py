@@ -0,0 +1,2096 @@
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import addModuleCleanup, mock
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from PIL import Image
+from adrf.test import AsyncAPIClient
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection, connections, transaction, IntegrityError
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, resolve
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from django_celery_beat.models import PeriodicTask
+from oauth2_provider.models import Application, AccessToken, RefreshToken
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient, APIRequestFactory
+
+from Api.benchmark import percentile, compare, generate_data, generate_tag_links, default_scenarios, run
+from Api.bulk import import_blogs
+from Api.celery import app as celery_app
+from Api.models import Blog, Tag, Comment, BLOG_CATEGORIES
+from Api.filters import BlogFilter, TagFilter
+from Api.pagination import CommentKeysetPagination
+from Api.parsers import FastJSONParser
+from Api.renderers import FastJSONRenderer
+from Api.routers import ReplicaRouter
+from Api.streaming import stream_json_array
+from Api.serializers import PreviewBlogSerializer, BlogSerializer, PreviewBlogValuesSerializer, BlogValuesSerializer
+from Api.throttling import CacheBucketStore, RedisBucketStore, get_bucket_store
+from Api.tasks import reconcile_blog_counters, clear_tokens, generate_profile_thumbnails
+from Api.thumbnails import store_thumbnails
+from Api.viewsets import BlogViewSet
+
+User = get_user_model()
+
+
+def get_temporary_image():
+    image = Image.new('RGB', (100, 100))
+    tmp_file = io.BytesIO()
+    image.save(tmp_file, 'png')
+    tmp_file.seek(0)
+    return SimpleUploadedFile('test.png', tmp_file.read(), content_type='image/png')
+
+
+def use_temporary_media_root(add_cleanup):
+    """
+    Point MEDIA_ROOT at a new directory; `add_cleanup` registers its removal.
+    """
+    directory = tempfile.mkdtemp()
+    add_cleanup(shutil.rmtree, directory)
+    media_root = override_settings(MEDIA_ROOT=directory)
+    media_root.enable()
+    add_cleanup(media_root.disable)
+
+
+def setUpModule():
+    # Every picture the tests upload goes to a temporary MEDIA_ROOT, not the project's media/.
+    use_temporary_media_root(addModuleCleanup)
+    # Sampled timing records would be logged into the test output; tests of the sink set their own rate.
+    unsampled = override_settings(REQUEST_TIMING={**settings.REQUEST_TIMING, 'SAMPLE_RATE': 0.0})
+    unsampled.enable()
+    addModuleCleanup(unsampled.disable)
+
+
+class BlogUserApiTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            bio='Test bio',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+
+    def test_create_user(self):
+        url = reverse('users')
+        data = {
+            'username': 'newuser',
+            'email': 'new@example.com',
+            'password': 'newpass123',
+            'bio': 'New bio',
+            'profile_picture': get_temporary_image()
+        }
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_retrieve_user_authenticated(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], self.user.username)
+
+    def test_update_user(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users')
+        data = {'bio': 'Updated bio'}
+        response = self.client.patch(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'Updated bio')
+
+    def test_delete_user(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users')
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(User.objects.filter(username='testuser').exists())
+
+    def test_create_user_unauthenticated_only(self):
+        # Authenticated user should not be able to create another user
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users')
+        data = {
+            'username': 'failuser',
+            'email': 'fail@example.com',
+            'password': 'failpass',
+            'bio': 'fail',
+            'profile_picture': get_temporary_image()
+        }
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retrieve_user_unauthenticated(self):
+        url = reverse('users')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_user_unauthenticated(self):
+        url = reverse('users')
+        data = {'bio': 'Should not update'}
+        response = self.client.patch(url, data)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_delete_user_unauthenticated(self):
+        url = reverse('users')
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BlogApiTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='blogger',
+            email='blogger@example.com',
+            password='blogpass',
+            bio='Blogger bio',
+            profile_picture=get_temporary_image()
+        )
+        self.tag = Tag.objects.create(name='django')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_blog(self):
+        url = '/blogs/'
+        data = {
+            'title': 'Test Blog',
+            'body': 'Blog content',
+            'category': 'TECHNOLOGY',
+            'tags': [{'name': 'django'}]
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Blog.objects.count(), 1)
+        self.assertEqual(Blog.objects.first().author, self.user)
+
+    def test_list_blogs(self):
+        Blog.objects.create(title='Blog1', body='Body1', author=self.user, category='TECHNOLOGY')
+        url = '/blogs/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(response.data), 1)
+
+    def test_update_blog(self):
+        blog = Blog.objects.create(title='Blog2', body='Body2', author=self.user, category='TECHNOLOGY')
+        url = f'/blogs/{blog.slug}/'
+        data = {'title': 'Updated Blog2'}
+        response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        blog.refresh_from_db()
+        self.assertEqual(blog.title, 'Updated Blog2')
+
+    def test_delete_blog(self):
+        blog = Blog.objects.create(title='Blog3', body='Body3', author=self.user, category='TECHNOLOGY')
+        url = f'/blogs/{blog.slug}/'
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Blog.objects.filter(id=blog.id).exists())
+
+    def test_blog_permissions(self):
+        other_user = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='otherpass',
+            bio='Other bio',
+            profile_picture=get_temporary_image()
+        )
+        blog = Blog.objects.create(title='Blog4', body='Body4', author=other_user, category='TECHNOLOGY')
+        blog.refresh_from_db()  # Ensure slug is generated
+        self.client.force_authenticate(user=self.user)
+        url = f'/blogs/{blog.slug}/'
+        response = self.client.patch(url, {'title': 'Hacked'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_blog_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        url = '/blogs/'
+        data = {
+            'title': 'NoAuth',
+            'body': 'NoAuth',
+            'category': 'TECHNOLOGY',
+            'tags': [{'name': 'django'}]
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_blog_unauthorized(self):
+        other_user = User.objects.create_user(
+            username='otheruser',
+            email='otheruser@example.com',
+            password='otherpass',
+            bio='Other bio',
+            profile_picture=get_temporary_image()
+        )
+        blog = Blog.objects.create(title='OtherBlog', body='Body', author=other_user, category='TECHNOLOGY')
+        url = f'/blogs/{blog.id}/'
+        response = self.client.patch(url, {'title': 'Should not update'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_blog_unauthorized(self):
+        other_user = User.objects.create_user(
+            username='otheruser2',
+            email='otheruser2@example.com',
+            password='otherpass2',
+            bio='Other bio2',
+            profile_picture=get_temporary_image()
+        )
+        blog = Blog.objects.create(title='OtherBlog2', body='Body', author=other_user, category='TECHNOLOGY')
+        url = f'/blogs/{blog.id}/'
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_blogs_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        url = '/blogs/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CommentApiTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='commenter',
+            email='commenter@example.com',
+            password='commentpass',
+            bio='Commenter bio',
+            profile_picture=get_temporary_image()
+        )
+        self.blog = Blog.objects.create(title='Blog', body='Body', author=self.user, category='TECHNOLOGY')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_comment(self):
+        url = '/comments/'
+        data = {'blog': self.blog.id, 'text': 'Nice post!'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Comment.objects.first().user, self.user)
+
+    def test_list_comments(self):
+        Comment.objects.create(user=self.user, blog=self.blog, text='First!')
+        url = '/comments/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(response.data), 1)
+
+    def test_update_comment(self):
+        comment = Comment.objects.create(user=self.user, blog=self.blog, text='Edit me')
+        url = f'/comments/{comment.id}/'
+        data = {'text': 'Edited'}
+        response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        comment.refresh_from_db()
+        self.assertEqual(comment.text, 'Edited')
+
+    def test_delete_comment(self):
+        comment = Comment.objects.create(user=self.user, blog=self.blog, text='Delete me')
+        url = f'/comments/{comment.id}/'
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Comment.objects.filter(id=comment.id).exists())
+
+    def test_comment_permissions(self):
+        other_user = User.objects.create_user(
+            username='other2',
+            email='other2@example.com',
+            password='other2pass',
+            bio='Other2 bio',
+            profile_picture=get_temporary_image()
+        )
+        comment = Comment.objects.create(user=other_user, blog=self.blog, text='Not yours')
+        url = f'/comments/{comment.id}/'
+        response = self.client.patch(url, {'text': 'Hacked'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_comment_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        url = '/comments/'
+        data = {'blog': self.blog.id, 'text': 'NoAuth'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_comment_unauthorized(self):
+        other_user = User.objects.create_user(
+            username='othercomment',
+            email='othercomment@example.com',
+            password='othercommentpass',
+            bio='Other comment bio',
+            profile_picture=get_temporary_image()
+        )
+        comment = Comment.objects.create(user=other_user, blog=self.blog, text='Not yours')
+        url = f'/comments/{comment.id}/'
+        response = self.client.patch(url, {'text': 'Should not update'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_comment_unauthorized(self):
+        other_user = User.objects.create_user(
+            username='othercomment2',
+            email='othercomment2@example.com',
+            password='othercommentpass2',
+            bio='Other comment bio2',
+            profile_picture=get_temporary_image()
+        )
+        comment = Comment.objects.create(user=other_user, blog=self.blog, text='Not yours 2')
+        url = f'/comments/{comment.id}/'
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_comments_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        url = '/comments/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BlogSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='searcher',
+            email='searcher@example.com',
+            password='searchpass',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, value):
+        response = self.client.get('/blogs/preview/', {'search': value})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [blog['title'] for blog in response.data['results']]
+
+    def test_search_title_body_and_author(self):
+        Blog.objects.create(title='Django tips', body='Models', author=self.user, category='TECHNOLOGY')
+        Blog.objects.create(title='Cooking', body='Pasta with django sauce', author=self.user, category='FINANCE')
+        Blog.objects.create(title='Football', body='Goals', author=self.user, category='SPORTS')
+        self.assertEqual(self.search('django'), ['Django tips', 'Cooking'])
+        self.assertCountEqual(self.search('searcher'), ['Football', 'Cooking', 'Django tips'])
+        self.assertEqual(self.search('djan'), ['Django tips', 'Cooking'])
+        self.assertEqual(self.search('django goals'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        blog = Blog.objects.create(title='Old title', body='Body', author=self.user, category='TECHNOLOGY')
+        blog.title = 'New title'
+        blog.save()
+        self.assertEqual(self.search('old'), [])
+        self.assertEqual(self.search('new'), ['New title'])
+        blog.delete()
+        self.assertEqual(self.search('new'), [])
+
+    def test_index_follows_author_rename(self):
+        Blog.objects.create(title='Post', body='Body', author=self.user, category='TECHNOLOGY')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.search('searcher'), [])
+        self.assertEqual(self.search('renamed'), ['Post'])
+
+    def test_rebuild_search_index(self):
+        Blog.objects.create(title='Indexed', body='Body', author=self.user, category='TECHNOLOGY')
+        Blog.objects.filter(title='Indexed').update(title='Bulk updated')
+        self.assertEqual(self.search('bulk'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search('bulk'), ['Bulk updated'])
+
+
+class BlogCursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='scroller',
+            email='scroller@example.com',
+            password='scrollpass',
+            profile_picture=get_temporary_image()
+        )
+        for i in range(7):
+            Blog.objects.create(title=f'Blog {i}', body='Body', author=self.user,
+                                category='SPORTS' if i % 2 else 'FINANCE')
+        # Force ties on created so the id tiebreaker is exercised.
+        Blog.objects.filter(title__in=['Blog 2', 'Blog 3', 'Blog 4']).update(
+            created=Blog.objects.get(title='Blog 3').created
+        )
+        self.client = APIClient()
+
+    def collect(self, url, params):
+        titles = []
+        pages = 0
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            titles.extend(blog['title'] for blog in response.data['results'])
+            url, params = response.data['next'], None
+            pages += 1
+        return titles, pages
+
+    def test_cursor_walks_every_blog_once(self):
+        titles, pages = self.collect('/blogs/preview/', {'pagination': 'cursor'})
+        expected = list(Blog.objects.order_by('-created', '-id').values_list('title', flat=True))
+        self.assertEqual(titles, expected)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_with_filters_and_page_size(self):
+        titles, pages = self.collect('/blogs/preview/', {'pagination': 'cursor', 'category': 'SPORTS', 'page_size': 2})
+        self.assertCountEqual(titles, ['Blog 1', 'Blog 3', 'Blog 5'])
+        self.assertEqual(pages, 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/blogs/preview/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/blogs/preview/')
+        self.assertEqual(response.data['count'], 7)
+
+
+class BlogCounterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='counter',
+            email='counter@example.com',
+            password='counterpass',
+            profile_picture=get_temporary_image()
+        )
+        self.blog = Blog.objects.create(title='Counted', body='Body', author=self.user, category='TECHNOLOGY')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_comment_count_follows_creates_moves_and_deletes(self):
+        other_blog = Blog.objects.create(title='Other', body='Body', author=self.user, category='TECHNOLOGY')
+        response = self.client.post('/comments/', {'blog': self.blog.id, 'text': 'One'}, format='json')
+        Comment.objects.create(user=self.user, blog=self.blog, text='Two')
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.comment_count, 2)
+
+        self.client.patch(f"/comments/{response.data['id']}/", {'blog': other_blog.id}, format='json')
+        self.blog.refresh_from_db()
+        other_blog.refresh_from_db()
+        self.assertEqual((self.blog.comment_count, other_blog.comment_count), (1, 1))
+
+        Comment.objects.filter(blog=self.blog).get().delete()
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.comment_count, 0)
+
+    def test_deleting_a_user_uncounts_their_comments(self):
+        commenter = User.objects.create_user(
+            username='commenter', email='commenter@example.com', password='pass', profile_picture=get_temporary_image()
+        )
+        other_blog = Blog.objects.create(title='Other', body='Body', author=self.user, category='SPORTS')
+        Comment.objects.bulk_create(
+            [Comment(user=commenter, blog=self.blog, text='Theirs') for _ in range(3)]
+            + [Comment(user=self.user, blog=self.blog, text='Mine'), Comment(user=commenter, blog=other_blog, text='')]
+        )
+        Blog.objects.filter(pk=self.blog.pk).update(comment_count=4)
+        Blog.objects.filter(pk=other_blog.pk).update(comment_count=1)
+        commenter.delete()
+        self.assertEqual(dict(Blog.objects.values_list('title', 'comment_count')), {'Counted': 1, 'Other': 0})
+
+    def test_deleting_a_blog_does_not_uncount_each_comment(self):
+        Comment.objects.bulk_create([Comment(user=self.user, blog=self.blog, text=f'{i}') for i in range(200)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f'/blogs/{self.blog.slug}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Comment.objects.exists())
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(updates, [])
+        # The blog's own invalidation, not one per comment.
+        self.assertLessEqual(len(queries), 16, '\n'.join(query['sql'] for query in queries.captured_queries))
+
+    def test_tag_count_follows_tag_changes(self):
+        self.client.patch(f'/blogs/{self.blog.slug}/', {'tag_names': ['a', 'b', 'c']}, format='json')
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.tag_count, 3)
+        self.client.patch(f'/blogs/{self.blog.slug}/', {'tag_names': ['a']}, format='json')
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.tag_count, 1)
+        Tag.objects.get(name='a').delete()
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.tag_count, 0)
+
+    def test_preview_exposes_counts_without_per_row_queries(self):
+        for i in range(2):
+            Comment.objects.create(user=self.user, blog=self.blog, text=f'Comment {i}')
+        Blog.objects.create(title='Second', body='Body', author=self.user, category='TECHNOLOGY')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/blogs/preview/')
+        counts = {blog['title']: blog['comment_count'] for blog in response.data['results']}
+        self.assertEqual(counts, {'Counted': 2, 'Second': 0})
+        self.assertFalse(any('api_comment' in query['sql'].lower() for query in queries.captured_queries))
+
+    def test_reconcile_blog_counters(self):
+        Comment.objects.create(user=self.user, blog=self.blog, text='Real')
+        Blog.objects.filter(pk=self.blog.pk).update(comment_count=10, tag_count=4)
+        self.assertEqual(reconcile_blog_counters(), 1)
+        self.blog.refresh_from_db()
+        self.assertEqual((self.blog.comment_count, self.blog.tag_count), (1, 0))
+        self.assertEqual(reconcile_blog_counters(), 0)
+
+
+class PreviewCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cached',
+            email='cached@example.com',
+            password='cachedpass',
+            profile_picture=get_temporary_image()
+        )
+        self.sports = Blog.objects.create(title='Match', body='Body', author=self.user, category='SPORTS')
+        self.finance = Blog.objects.create(title='Stocks', body='Body', author=self.user, category='FINANCE')
+        self.client = APIClient()
+
+    def get_titles(self, params=None):
+        response = self.client.get('/blogs/preview/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [blog['title'] for blog in response.data['results']]
+
+    def test_repeated_request_is_served_from_cache(self):
+        self.get_titles({'category': 'SPORTS', 'title__icontains': ''})
+        with self.assertNumQueries(0):
+            titles = self.get_titles({'category': 'SPORTS'})
+        self.assertEqual(titles, ['Match'])
+
+    def test_blog_save_only_invalidates_affected_category(self):
+        self.get_titles({'category': 'SPORTS'})
+        self.get_titles({'category': 'FINANCE'})
+        self.get_titles()
+        Blog.objects.create(title='Bonds', body='Body', author=self.user, category='FINANCE')
+        with self.assertNumQueries(0):
+            self.get_titles({'category': 'SPORTS'})
+        self.assertEqual(self.get_titles({'category': 'FINANCE'}), ['Bonds', 'Stocks'])
+        self.assertEqual(self.get_titles(), ['Bonds', 'Stocks', 'Match'])
+
+    def test_category_change_invalidates_old_and_new_category(self):
+        self.get_titles({'category': 'SPORTS'})
+        self.get_titles({'category': 'FINANCE'})
+        blog = Blog.objects.get(pk=self.sports.pk)
+        blog.category = 'FINANCE'
+        blog.save()
+        self.assertEqual(self.get_titles({'category': 'SPORTS'}), [])
+        self.assertEqual(self.get_titles({'category': 'FINANCE'}), ['Stocks', 'Match'])
+
+    def test_tag_and_comment_changes_invalidate(self):
+        tag = Tag.objects.create(name='old')
+        self.sports.tags.add(tag)
+        self.get_titles({'category': 'SPORTS'})
+        tag.name = 'new'
+        tag.save()
+        response = self.client.get('/blogs/preview/', {'category': 'SPORTS'})
+        self.assertEqual(response.data['results'][0]['tags'], ['new'])
+        Comment.objects.create(user=self.user, blog=self.sports, text='Hi')
+        response = self.client.get('/blogs/preview/', {'category': 'SPORTS'})
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+
+    def test_deleting_a_commenter_invalidates_the_blogs_they_commented_on(self):
+        commenter = User.objects.create_user(
+            username='commenter', email='commenter@example.com', password='pass', profile_picture=get_temporary_image()
+        )
+        Comment.objects.create(user=commenter, blog=self.sports, text='Hi')
+        self.get_titles({'category': 'SPORTS'})
+        self.get_titles({'category': 'FINANCE'})
+        commenter.delete()
+        with self.assertNumQueries(0):
+            self.get_titles({'category': 'FINANCE'})
+        response = self.client.get('/blogs/preview/', {'category': 'SPORTS'})
+        self.assertEqual(response.data['results'][0]['comment_count'], 0)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='poller',
+            email='poller@example.com',
+            password='pollerpass',
+            profile_picture=get_temporary_image()
+        )
+        self.blog = Blog.objects.create(title='Polled', body='Body', author=self.user, category='SPORTS')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertRevalidates(self, url, params=None, last_modified=True):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual('Last-Modified' in response, last_modified)
+        etag = response['ETag']
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_detail(self):
+        url = f'/blogs/{self.blog.slug}/'
+        etag = self.assertRevalidates(url)
+        Comment.objects.create(user=self.user, blog=self.blog, text='New')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        url = f'/blogs/{self.blog.slug}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_and_preview(self):
+        for url in ('/blogs/', '/blogs/preview/'):
+            etag = self.assertRevalidates(url, {'category': 'SPORTS'}, last_modified=False)
+            Blog.objects.create(title=f'Another {url}', body='Body', author=self.user, category='SPORTS')
+            response = self.client.get(url, {'category': 'SPORTS'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleting_a_blog_changes_list_validators(self):
+        older = Blog.objects.create(title='Older', body='Body', author=self.user, category='SPORTS')
+        Blog.objects.filter(pk=older.pk).update(updated=timezone.now() - timedelta(hours=1))
+        urls = ('/blogs/', '/blogs/preview/')
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        older.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn('Last-Modified', response)
+                # The newest blog is unchanged, so a Last-Modified check would have passed.
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_if_modified_since_after_a_new_comment(self):
+        url = f'/blogs/{self.blog.slug}/'
+        Blog.objects.filter(pk=self.blog.pk).update(updated=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get(url)['Last-Modified']
+        Comment.objects.create(user=self.user, blog=self.blog, text='New')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def assertChangesValidators(self, change):
+        tag = Tag.objects.create(name='polled')
+        self.blog.tags.add(tag)
+        urls = (f'/blogs/{self.blog.slug}/', '/blogs/', '/blogs/preview/')
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        change(tag)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_author_rename_changes_validators(self):
+        def rename_author(tag):
+            self.user.username = 'renamed'
+            self.user.save()
+
+        self.assertChangesValidators(rename_author)
+
+    def test_tag_rename_changes_validators(self):
+        def rename_tag(tag):
+            tag.name = 'renamed'
+            tag.save()
+
+        self.assertChangesValidators(rename_tag)
+
+    def test_not_modified_skips_serialization(self):
+        etag = self.client.get('/blogs/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/blogs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_blog_is_still_404(self):
+        response = self.client.get('/blogs/missing/', HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TagResolutionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='tagger',
+            email='tagger@example.com',
+            password='taggerpass',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_resolve_reuses_existing_tags_case_insensitively(self):
+        django_tag = Tag.objects.create(name='Django')
+        with self.assertNumQueries(3):
+            tags = Tag.objects.resolve(['django', ' python ', 'PYTHON', '', 'web'])
+        self.assertEqual([tag.name for tag in tags], ['Django', 'python', 'web'])
+        self.assertEqual(tags[0], django_tag)
+        with self.assertNumQueries(1):
+            self.assertEqual(Tag.objects.resolve(['WEB', 'Python']), tags[:0:-1])
+
+    def test_tag_names_are_unique_case_insensitively(self):
+        Tag.objects.create(name='django')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(name='DJANGO')
+
+    def test_create_blog_with_tag_names(self):
+        Tag.objects.create(name='django')
+        data = {'title': 'Tagged', 'body': 'Body', 'category': 'TECHNOLOGY', 'tag_names': ['Django', 'orm']}
+        response = self.client.post('/blogs/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['tags'], ['django', 'orm'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_non_ascii_names(self):
+        tags = Tag.objects.resolve(['Ärger'])
+        self.assertEqual(Tag.objects.resolve(['ärger', 'ÄRGER']), tags)
+        data = {'title': 'Umlauts', 'body': 'Body', 'category': 'TECHNOLOGY', 'tag_names': ['ÄRGER', 'Straße']}
+        response = self.client.post('/blogs/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['tags'], ['Ärger', 'Straße'])
+        response = self.client.get('/blogs/', {'tag_names': 'ärger,STRAßE', 'tag_mode': 'all'})
+        self.assertEqual([blog['title'] for blog in response.data['results']], ['Umlauts'])
+        self.assertEqual([tag['name'] for tag in self.client.get('/tags/', {'prefix': 'äR'}).data['results']], ['Ärger'])
+
+    def test_tag_name_too_long(self):
+        data = {'title': 'Tagged', 'body': 'Body', 'category': 'TECHNOLOGY', 'tag_names': ['x' * 16]}
+        response = self.client.post('/blogs/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkImportExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='importer',
+            email='importer@example.com',
+            password='importerpass',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def post_ndjson(self, lines):
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return self.client.post('/blogs/import/', data=body.encode(), content_type='application/x-ndjson')
+
+    def test_import_matches_existing_tags_by_name_key(self):
+        padded = Tag.objects.create(name=' Python ')
+        umlaut = Tag.objects.create(name='Ärger')
+        response = self.post_ndjson([
+            {'title': 'Keyed', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['python', 'ÄRGER']},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(Blog.objects.get(title='Keyed').tags.all()), {padded, umlaut})
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_import_creates_blogs_tags_and_reports_bad_lines(self):
+        Blog.objects.create(title='Same title', body='Body', author=self.user, category='SPORTS')
+        response = self.post_ndjson([
+            {'title': 'Same title', 'body': 'One', 'category': 'SPORTS', 'tag_names': ['Django', 'web']},
+            {'title': 'Same title', 'body': 'Two', 'category': 'FINANCE', 'tag_names': ['django']},
+            '{not json',
+            {'title': 'No category', 'body': 'Three'},
+            '',
+            {'title': 'Searchable import', 'body': 'Four', 'category': 'SPORTS'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(
+            sorted(Blog.objects.values_list('slug', flat=True)),
+            ['same-title', 'same-title-2', 'same-title-3', 'searchable-import']
+        )
+        blog = Blog.objects.get(slug='same-title-2')
+        self.assertEqual(sorted(tag.name for tag in blog.tags.all()), ['Django', 'web'])
+        self.assertEqual(blog.tag_count, 2)
+        self.assertEqual(Tag.objects.count(), 2)
+        response = self.client.get('/blogs/preview/', {'search': 'searchable'})
+        self.assertEqual([blog['title'] for blog in response.data['results']], ['Searchable import'])
+
+    def test_import_is_chunked(self):
+        lines = [{'title': f'Post {i}', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['bulk']}
+                 for i in range(12)]
+        with CaptureQueriesContext(connection) as queries:
+            created, errors = import_blogs(((i, line) for i, line in enumerate(lines)), self.user, chunk_size=5)
+        self.assertEqual((created, errors), (12, []))
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "Api_blog"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_export_streams_filtered_ndjson(self):
+        blog = Blog.objects.create(title='Exported', body='Body', author=self.user, category='SPORTS')
+        blog.tags.set(Tag.objects.resolve(['a', 'b']))
+        Blog.objects.create(title='Other', body='Body', author=self.user, category='FINANCE')
+        response = self.client.get('/blogs/export/', {'category': 'SPORTS'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]['title'], 'Exported')
+        self.assertEqual(sorted(lines[0]['tag_names']), ['a', 'b'])
+
+    def test_export_round_trips_through_import(self):
+        Blog.objects.create(title='Round trip', body='Body', author=self.user, category='SPORTS')
+        exported = b''.join(self.client.get('/blogs/export/').streaming_content).decode().splitlines()
+        response = self.post_ndjson(exported)
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(Blog.objects.filter(slug='round-trip-2').exists())
+
+
+timing_records = []
+
+
+def collect_timing(record):
+    timing_records.append(record)
+
+
+class RequestTimingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        timing_records.clear()
+        self.user = User.objects.create_user(
+            username='timed',
+            email='timed@example.com',
+            password='timedpass',
+            profile_picture=get_temporary_image()
+        )
+        Blog.objects.create(title='Timed', body='Body', author=self.user, category='SPORTS')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/blogs/preview/')
+        metrics = dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+        self.assertEqual(set(metrics), {'db', 'render', 'app', 'total'})
+        self.assertRegex(metrics['db'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 1.0, 'SINK': 'Api.tests.test_api.collect_timing'})
+    def test_sampled_records_reach_the_sink(self):
+        self.client.get('/blogs/preview/')
+        self.client.get('/comments/')
+        self.assertEqual(
+            [(record['view'], record['status']) for record in timing_records],
+            [('BlogViewSet.preview', 200), ('CommentViewSet.list', 200)]
+        )
+        self.assertGreater(timing_records[0]['queries'], 0)
+        self.assertGreaterEqual(timing_records[0]['total_ms'], timing_records[0]['db_ms'])
+        self.assertIn('render_ms', timing_records[0])
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 0.0, 'SINK': 'Api.tests.test_api.collect_timing'})
+    def test_unsampled_requests_skip_the_sink(self):
+        self.client.get('/blogs/preview/')
+        self.assertEqual(timing_records, [])
+
+
+def seed_blog_data(users=4, blogs_per_user=6, tags=8, comments_per_blog=3):
+    """
+    A realistic dataset for query budget tests: several authors, tagged blogs in
+    every category, and comments from other users. Returns the created users.
+    """
+    picture = get_temporary_image()
+    authors = [
+        User.objects.create_user(
+            username=f'seed{i}',
+            email=f'seed{i}@example.com',
+            password='seedpass',
+            profile_picture=picture
+        )
+        for i in range(users)
+    ]
+    all_tags = Tag.objects.resolve([f'tag{i}' for i in range(tags)])
+    categories = [category for category, _ in BLOG_CATEGORIES]
+    for i, author in enumerate(authors):
+        for j in range(blogs_per_user):
+            blog = Blog.objects.create(
+                title=f'Seed blog {i} {j}',
+                body='Seeded body text ' * 50,
+                author=author,
+                category=categories[(i + j) % len(categories)]
+            )
+            blog.tags.set(all_tags[j % tags:j % tags + 3])
+            for k in range(comments_per_blog):
+                Comment.objects.create(user=authors[(i + k + 1) % users], blog=blog, text=f'Comment {k}')
+    return authors
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    assertMaxQueries fails with the full list of executed SQL when a block runs
+    more queries than its budget.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label=''):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        if len(queries) > budget:
+            statements = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(queries.captured_queries, start=1)
+            )
+            self.fail(f'{label} ran {len(queries)} queries, budget is {budget}:\n{statements}')
+
+
+def query_budget(budget):
+    """
+    Decorator for QueryBudgetTestCase methods returning a zero-argument callable:
+    the callable must stay within `budget` queries.
+    """
+
+    def decorator(test):
+        @wraps(test)
+        def wrapper(self):
+            request = test(self)
+            with self.assertMaxQueries(budget, label=test.__name__):
+                response = request()
+            self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+
+        return wrapper
+
+    return decorator
+
+
+class ApiQueryBudgetTests(QueryBudgetTestCase):
+    """
+    One query budget per router action in Api/urls.py, against seeded data. List
+    budgets are checked at several page sizes so that N+1 queries show up.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_blog_data()
+        cls.user = cls.users[0]
+        cls.blog = Blog.objects.filter(author=cls.user).first()
+        cls.comment = Comment.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertListBudget(self, budget, url, params=None):
+        for page_size in (2, 20):
+            cache.clear()
+            with self.assertMaxQueries(budget, label=f'{url} page_size={page_size}'):
+                response = self.client.get(url, {**(params or {}), 'pagination': 'cursor', 'page_size': page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # /users/
+
+    @query_budget(0)
+    def test_user_retrieve(self):
+        return lambda: self.client.get('/users/')
+
+    @query_budget(2)
+    def test_user_partial_update(self):
+        self.assertTrue(generate_profile_thumbnails(self.user.pk))
+        self.user.refresh_from_db()
+        return lambda: self.client.patch('/users/', {'bio': 'Budget'})
+
+    @query_budget(3)
+    def test_user_partial_update_with_pending_thumbnails(self):
+        # The save re-reads the thumbnails, which may have been made since the user was loaded.
+        self.assertFalse(self.user.thumbnail_webp)
+        return lambda: self.client.patch('/users/', {'bio': 'Budget'})
+
+    @query_budget(2)
+    def test_user_create(self):
+        self.client.force_authenticate(user=None)
+        data = {'username': 'budget', 'email': 'budget@example.com', 'password': 'budgetpass',
+                'profile_picture': get_temporary_image()}
+        return lambda: self.client.post('/users/', data, format='multipart')
+
+    # /blogs/
+
+    def test_blog_list(self):
+        self.assertListBudget(3, '/blogs/')
+        self.assertListBudget(3, '/blogs/', {'category': 'SPORTS', 'tag_names': 'tag1'})
+
+    def test_blog_preview(self):
+        self.assertListBudget(3, '/blogs/preview/')
+        self.assertListBudget(3, '/blogs/preview/', {'search': 'seed'})
+
+    @query_budget(4)
+    def test_blog_list_page_number(self):
+        return lambda: self.client.get('/blogs/', {'page': 2})
+
+    @query_budget(3)
+    def test_blog_retrieve(self):
+        return lambda: self.client.get(f'/blogs/{self.blog.slug}/')
+
+    @query_budget(16)
+    def test_blog_create(self):
+        data = {'title': 'Budget', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['tag1', 'tag2', 'new']}
+        return lambda: self.client.post('/blogs/', data, format='json')
+
+    @query_budget(18)
+    def test_blog_partial_update(self):
+        data = {'title': 'Budget', 'tag_names': ['tag1', 'tag2', 'new']}
+        return lambda: self.client.patch(f'/blogs/{self.blog.slug}/', data, format='json')
+
+    @query_budget(16)
+    def test_blog_destroy(self):
+        return lambda: self.client.delete(f'/blogs/{self.blog.slug}/')
+
+    @query_budget(24)
+    def test_blog_import(self):
+        body = '\n'.join(
+            json.dumps({'title': f'Imported {i}', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['tag1']})
+            for i in range(100)
+        )
+        return lambda: self.client.post('/blogs/import/', data=body.encode(), content_type='application/x-ndjson')
+
+    def test_blog_comments(self):
+        self.assertListBudget(2, f'/blogs/{self.blog.slug}/comments/')
+
+    def test_blog_export(self):
+        with self.assertMaxQueries(2, label='export'):
+            response = self.client.get('/blogs/export/')
+            b''.join(response.streaming_content)
+
+    # /comments/
+
+    @query_budget(2)
+    def test_comment_list(self):
+        return lambda: self.client.get('/comments/')
+
+    @query_budget(1)
+    def test_comment_retrieve(self):
+        return lambda: self.client.get(f'/comments/{self.comment.pk}/')
+
+    @query_budget(4)
+    def test_comment_create(self):
+        return lambda: self.client.post('/comments/', {'blog': self.blog.pk, 'text': 'Budget'}, format='json')
+
+    @query_budget(3)
+    def test_comment_partial_update(self):
+        return lambda: self.client.patch(f'/comments/{self.comment.pk}/', {'text': 'Budget'}, format='json')
+
+    @query_budget(4)
+    def test_comment_destroy(self):
+        return lambda: self.client.delete(f'/comments/{self.comment.pk}/')
+
+    # /tags/ and /categories/
+
+    @query_budget(2)
+    def test_tag_list(self):
+        return lambda: self.client.get('/tags/', {'prefix': 'tag'})
+
+    @query_budget(1)
+    def test_tag_popular(self):
+        return lambda: self.client.get('/tags/popular/')
+
+    @query_budget(0)
+    def test_category_list(self):
+        return lambda: self.client.get('/categories/')
+
+
+class BenchmarkTests(APITestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (0.5, 0.95, 0.99)], [50, 95, 99])
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_compare_flags_latency_and_throughput_regressions(self):
+        baseline = {'total': {'p95_ms': 10, 'rps': 100}, 'scenarios': {'preview': {'p95_ms': 10}}}
+        results = {'total': {'p95_ms': 11, 'rps': 70}, 'scenarios': {'preview': {'p95_ms': 20}}}
+        self.assertEqual(len(compare(results, baseline, tolerance=0.2)), 2)
+        self.assertEqual(compare(results, baseline, tolerance=1.5), [])
+
+    def test_seed_and_run(self):
+        counts = generate_data(users=2, blogs=20, comments=40, tags=10)
+        self.assertEqual(counts, {'users': 2, 'blogs': 20, 'comments': 40})
+        self.assertEqual(sum(Blog.objects.values_list('comment_count', flat=True)), 40)
+        user = User.objects.get(username='bench-user-0')
+        results = run(default_scenarios(random.Random(0), user), requests=40, user=user, host='testserver')
+        self.assertEqual(results['total']['requests'], 40)
+        self.assertEqual(results['total']['errors'], 0)
+        self.assertLessEqual(results['total']['p50_ms'], results['total']['p99_ms'])
+
+    def test_serializer_benchmark(self):
+        generate_data(users=2, blogs=20, comments=0, tags=10)
+        output = io.StringIO()
+        call_command('benchmark_serializers', page_size=5, pages=2, repeat=1, stdout=output)
+        self.assertIn('preview', output.getvalue())
+
+    def test_json_benchmark(self):
+        generate_data(users=2, blogs=5, comments=5, tags=5)
+        output = io.StringIO()
+        call_command('benchmark_json', page_size=5, repeat=1, stdout=output)
+        self.assertIn('previews', output.getvalue())
+
+    def test_tag_filter_benchmark(self):
+        added = generate_tag_links(100, tags=10, tags_per_blog=4)
+        self.assertEqual(added, 25)
+        self.assertEqual(Blog.tags.through.objects.count(), 100)
+        self.assertEqual(sum(Tag.objects.values_list('usage_count', flat=True)), 100)
+        self.assertEqual(generate_tag_links(100), 0)
+        output = io.StringIO()
+        call_command('benchmark_tag_filters', repeat=1, stdout=output)
+        self.assertIn('semi_join', output.getvalue())
+
+
+class AccessTokenCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='tokenuser',
+            email='tokenuser@example.com',
+            password='tokenpass',
+            profile_picture=get_temporary_image()
+        )
+        self.application = Application.objects.create(
+            name='Test app',
+            user=self.user,
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_PASSWORD,
+            client_id='client',
+            client_secret='secret',
+        )
+        self.access_token = AccessToken.objects.create(
+            user=self.user,
+            application=self.application,
+            token='cached-token',
+            expires=timezone.now() + timedelta(hours=1),
+            scope='read write',
+        )
+        self.client = APIClient()
+
+    def get_profile(self, token='cached-token'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/users/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        token_queries = [query for query in queries.captured_queries if 'oauth2_provider' in query['sql']]
+        return response, token_queries
+
+    def test_hot_token_costs_no_queries(self):
+        response, token_queries = self.get_profile()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(token_queries), 1)
+        response, token_queries = self.get_profile()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'tokenuser')
+        self.assertEqual(token_queries, [])
+
+    def test_revoked_token_is_rejected(self):
+        self.get_profile()
+        self.access_token.revoke()
+        response, _ = self.get_profile()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_is_rejected(self):
+        self.get_profile()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            response, _ = self.get_profile()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_is_visible(self):
+        self.get_profile()
+        self.client.patch('/users/', {'bio': 'Fresh'}, HTTP_AUTHORIZATION='Bearer cached-token')
+        response, _ = self.get_profile()
+        self.assertEqual(response.data['bio'], 'Fresh')
+
+    def test_refresh_rotation_invalidates_old_access_token(self):
+        RefreshToken.objects.create(
+            user=self.user, application=self.application, token='refresh', access_token=self.access_token
+        )
+        self.get_profile()
+        response = self.client.post('/o/token/', {
+            'grant_type': 'refresh_token',
+            'refresh_token': 'refresh',
+            'client_id': 'client',
+            'client_secret': 'secret',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_token = response.json()['access_token']
+        response, _ = self.get_profile()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response, _ = self.get_profile(new_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(OAUTH2_PROVIDER={
+    **settings.OAUTH2_PROVIDER,
+    'CLEAR_EXPIRED_TOKENS_BATCH_SIZE': 3,
+    'CLEAR_EXPIRED_TOKENS_BATCH_INTERVAL': 0,
+})
+class TokenPurgeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='purged',
+            email='purged@example.com',
+            password='purgedpass',
+            profile_picture=get_temporary_image()
+        )
+        now = timezone.now()
+        for i in range(7):
+            AccessToken.objects.create(user=self.user, token=f'expired{i}', expires=now - timedelta(hours=1))
+        for i in range(2):
+            AccessToken.objects.create(user=self.user, token=f'valid{i}', expires=now + timedelta(hours=1))
+
+    def test_purge_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            metrics = clear_tokens(max_seconds=0)
+        self.assertEqual(metrics['deleted'], {'access_tokens': 7})
+        self.assertTrue(metrics['finished'])
+        self.assertEqual(sorted(AccessToken.objects.values_list('token', flat=True)), ['valid0', 'valid1'])
+        deletes = [query for query in queries.captured_queries
+                   if query['sql'].startswith('DELETE FROM "oauth2_provider_accesstoken"')]
+        self.assertEqual(len(deletes), 3)
+
+    def test_purge_requeues_itself_when_out_of_time(self):
+        with mock.patch.object(clear_tokens, 'apply_async') as apply_async:
+            metrics = clear_tokens(max_seconds=1e-9)
+        self.assertFalse(metrics['finished'])
+        self.assertEqual(AccessToken.objects.count(), 6)
+        kwargs = apply_async.call_args.kwargs['kwargs']
+        metrics = clear_tokens(max_seconds=0, **kwargs)
+        self.assertEqual(metrics['deleted'], {'access_tokens': 7})
+        self.assertEqual(AccessToken.objects.count(), 2)
+
+    def test_setup_periodic_tasks(self):
+        call_command('setup_periodic_tasks', stdout=io.StringIO())
+        call_command('setup_periodic_tasks', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(PeriodicTask.objects.values_list('task', flat=True)),
+            ['Api.tasks.clear_tokens', 'Api.tasks.reconcile_blog_counters']
+        )
+
+    def test_beat_reads_the_database_schedule(self):
+        self.assertEqual(celery_app.conf.beat_scheduler, 'django_celery_beat.schedulers:DatabaseScheduler')
+
+
+class ProfileThumbnailTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        use_temporary_media_root(self.addCleanup)
+        self.user = User.objects.create_user(
+            username='pictured',
+            email='pictured@example.com',
+            password='picturedpass',
+            profile_picture=get_temporary_image()
+        )
+        Blog.objects.create(title='Card', body='Body', author=self.user, category='SPORTS')
+        self.client = APIClient()
+
+    def get_card(self):
+        response = self.client.get('/blogs/preview/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results'][0]
+
+    def test_cards_fall_back_to_original_until_thumbnails_are_ready(self):
+        card = self.get_card()
+        self.assertEqual(card['profile_thumbnail'], card['profile_picture'])
+        self.assertEqual(card['profile_thumbnail_jpeg'], card['profile_picture'])
+
+        self.assertTrue(generate_profile_thumbnails(self.user.pk))
+        card = self.get_card()
+        self.assertTrue(card['profile_thumbnail'].endswith('_128x128.webp'))
+        self.assertTrue(card['profile_thumbnail_jpeg'].endswith('_128x128.jpg'))
+        self.user.refresh_from_db()
+        with Image.open(self.user.thumbnail_webp.path) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (128, 128)))
+        with Image.open(self.user.thumbnail_jpeg.path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (128, 128)))
+
+    def test_new_picture_resets_and_queues_thumbnails(self):
+        generate_profile_thumbnails(self.user.pk)
+        user = User.objects.get(pk=self.user.pk)
+        old_thumbnails = [user.thumbnail_webp.path, user.thumbnail_jpeg.path]
+        user.profile_picture = get_temporary_image()
+        with mock.patch.object(generate_profile_thumbnails, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                user.save()
+        delay.assert_called_once_with(user.pk)
+        card = self.get_card()
+        self.assertEqual(card['profile_thumbnail'], card['profile_picture'])
+        self.assertFalse(any(os.path.exists(path) for path in old_thumbnails))
+
+    def test_other_changes_do_not_queue_thumbnails(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.bio = 'Waiting for thumbnails'
+        with mock.patch.object(generate_profile_thumbnails, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                user.save()
+        delay.assert_not_called()
+
+    def test_a_stale_copy_keeps_thumbnails_made_meanwhile(self):
+        stale = User.objects.get(pk=self.user.pk)
+        generate_profile_thumbnails(self.user.pk)
+        stale.bio = 'Saved without thumbnails'
+        with mock.patch.object(generate_profile_thumbnails, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                stale.save()
+        delay.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.thumbnail_webp.name.endswith('_128x128.webp'))
+        self.assertTrue(os.path.exists(self.user.thumbnail_webp.path))
+
+    def test_thumbnails_of_a_replaced_picture_are_discarded(self):
+        old_name = self.user.profile_picture.name
+        User.objects.filter(pk=self.user.pk).update(profile_picture='images/profile_pictures/other.png')
+        self.assertFalse(store_thumbnails(self.user.pk, old_name, {'webp': b'webp', 'jpeg': b'jpeg'}))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.thumbnail_webp.name, '')
+
+    def test_backfill_command(self):
+        User.objects.create_user(
+            username='pictured2',
+            email='pictured2@example.com',
+            password='picturedpass',
+            profile_picture=get_temporary_image()
+        )
+        User.objects.filter(username='pictured2').update(thumbnail_webp='', thumbnail_jpeg='')
+        out = io.StringIO()
+        call_command('backfill_thumbnails', processes=2, stdout=out)
+        self.assertIn('Generated thumbnails of 2 users, 0 failed.', out.getvalue())
+        self.assertFalse(User.objects.filter(thumbnail_webp='').exists())
+        out = io.StringIO()
+        call_command('backfill_thumbnails', processes=1, stdout=out)
+        self.assertIn('Generated thumbnails of 0 users', out.getvalue())
+
+
+class QueryShapeIndexTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='Indexed',
+            email='indexed@example.com',
+            password='indexedpass',
+            profile_picture=get_temporary_image()
+        )
+        self.blog = Blog.objects.create(title='Planned', body='Body', author=self.user, category='SPORTS')
+        self.blog.tags.add(Tag.objects.create(name='plans'))
+        Comment.objects.create(user=self.user, blog=self.blog, text='Hi')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_author_exact_is_case_insensitive(self):
+        response = self.client.get('/blogs/', {'author_exact': 'indexed'})
+        self.assertEqual([blog['title'] for blog in response.data['results']], ['Planned'])
+        response = self.client.get('/blogs/', {'author_exact': 'index'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_no_filter_shape_scans_a_table(self):
+        out = io.StringIO()
+        call_command('explain_blog_filters', fail_on_scan=True, stdout=out)
+        self.assertIn('blogs?category: ok', out.getvalue())
+        self.assertIn('comments?blog: ok', out.getvalue())
+        self.assertIn('0 query shapes with full scans.', out.getvalue())
+
+
+class BlogCommentsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='commenter',
+            email='commenter@example.com',
+            password='commenterpass',
+            profile_picture=get_temporary_image()
+        )
+        self.blog = Blog.objects.create(title='Popular', body='Body', author=self.user, category='SPORTS')
+        other = Blog.objects.create(title='Other', body='Body', author=self.user, category='SPORTS')
+        created = timezone.now()
+        # Same timestamps, so the pages can only be told apart by id.
+        self.comments = Comment.objects.bulk_create(
+            [Comment(user=self.user, blog=self.blog, text=f'Comment {i}') for i in range(5)]
+            + [Comment(user=self.user, blog=other, text='Elsewhere')]
+        )
+        Comment.objects.update(created=created)
+        self.client = APIClient()
+
+    def test_pages_through_one_blogs_comments(self):
+        url = f'/blogs/{self.blog.slug}/comments/'
+        texts = []
+        params = {'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            texts += [comment['text'] for comment in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(texts, [f'Comment {i}' for i in range(5)])
+
+    def test_embeds_the_commenter(self):
+        response = self.client.get(f'/blogs/{self.blog.slug}/comments/')
+        comment = response.data['results'][0]
+        self.assertEqual(comment['username'], 'commenter')
+        self.assertEqual(comment['user'], self.user.pk)
+        self.assertTrue(comment['profile_thumbnail'].endswith('.png'))
+
+    def test_unknown_blog(self):
+        response = self.client.get('/blogs/missing/comments/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_is_an_index_range(self):
+        paginator = CommentKeysetPagination()
+        comment = self.comments[1]
+        queryset = Comment.objects.filter(blog_id=self.blog.pk).order_by(*paginator.ordering)
+        plan = queryset.filter(paginator.get_seek_filter([comment.created, comment.pk]))[:3].explain()
+        self.assertIn('comment_blog_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadReplicaTests(APITransactionTestCase):
+    """
+    A primary and a replica SQLite file; replicate() copies the primary over the
+    replica, anything written after that is only on the primary.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+
+    def replicate(self):
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(connections.settings['replica']['NAME'])
+        connections['default'].connection.backup(replica)
+        replica.close()
+        # Connected here: the test framework refuses to open connections to databases
+        # the test case doesn't declare, and a declared one must be in settings.
+        connections['replica'].close()
+        connections['replica'].connect()
+
+    def setUp(self):
+        cache.clear()
+        # Commits run on_commit callbacks here, and there is no broker to queue thumbnails on.
+        patcher = mock.patch('Api.signals.enqueue_thumbnails')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            username='replicated',
+            email='replicated@example.com',
+            password='replicatedpass',
+            profile_picture=get_temporary_image()
+        )
+        Blog.objects.create(title='Replicated', body='Body', author=self.user, category='SPORTS')
+        self.replicate()
+        Blog.objects.create(title='Lagging', body='Body', author=self.user, category='SPORTS')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get_titles(self, url='/blogs/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [blog['title'] for blog in response.data['results']]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.get_titles(), ['Replicated'])
+
+    def test_writer_reads_its_writes_from_the_primary(self):
+        response = self.client.post('/blogs/', {'title': 'Written', 'body': 'Body', 'category': 'SPORTS'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_titles(), ['Written', 'Lagging', 'Replicated'])
+        # The pin expires.
+        cache.clear()
+        self.assertEqual(self.get_titles(), ['Replicated'])
+
+    def test_cached_previews_are_built_on_the_primary(self):
+        self.assertEqual(self.get_titles('/blogs/preview/'), ['Lagging', 'Replicated'])
+
+    @override_settings(REQUEST_TIMING={'SAMPLE_RATE': 1.0, 'SINK': 'Api.tests.test_api.collect_timing'})
+    @mock.patch('Api.streaming.STREAM_CHUNK_SIZE', 1)
+    def test_streamed_lists_are_read_from_the_replica_and_timed(self):
+        timing_records.clear()
+        with CaptureQueriesContext(connections['default']) as primary_queries:
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                response = self.client.get('/blogs/?pagination=none')
+                self.assertNotIn('Server-Timing', response)
+                content = b''.join(response.streaming_content)
+        self.assertEqual([blog['title'] for blog in json.loads(content)], ['Replicated'])
+        self.assertTrue(any('"Api_blog"' in query['sql'] for query in replica_queries))
+        self.assertEqual(len(timing_records), 1)
+        self.assertEqual(timing_records[0]['queries'], len(primary_queries) + len(replica_queries))
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'Api'))
+        self.assertTrue(router.allow_migrate('default', 'Api'))
+        self.assertEqual(router.db_for_write(Blog), 'default')
+        self.assertEqual(router.db_for_read(Blog), 'default')
+
+
+class SQLiteProfileTests(APITransactionTestCase):
+    def test_production_profile_pragmas(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wrapper = SQLiteDatabaseWrapper({
+            **connections['default'].settings_dict,
+            **settings.DATABASE_PROFILES['production'],
+            'NAME': os.path.join(directory, 'production.sqlite3'),
+        }, alias='production')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -65536,
+            'mmap_size': 268435456,
+        })
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+    def test_benchmark_profiles(self):
+        generate_data(users=2, blogs=20, comments=20, tags=5)
+        out = io.StringIO()
+        call_command('benchmark_sqlite_profiles', requests=20, concurrency=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(any(line.startswith('default ') for line in lines))
+        self.assertTrue(any(line.startswith('production ') for line in lines))
+
+
+class TagPopularityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='tagger',
+            email='tagger@example.com',
+            password='taggerpass',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_blog(self, title, tag_names):
+        response = self.client.post('/blogs/', {
+            'title': title, 'body': 'Body', 'category': 'SPORTS', 'tag_names': tag_names,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['slug']
+
+    def usage_counts(self):
+        return dict(Tag.objects.values_list('name', 'usage_count'))
+
+    def test_usage_count_follows_tagging(self):
+        slug = self.create_blog('One', ['django', 'python'])
+        self.create_blog('Two', ['django'])
+        self.assertEqual(self.usage_counts(), {'django': 2, 'python': 1})
+        self.client.patch(f'/blogs/{slug}/', {'tag_names': ['python', 'web']}, format='json')
+        self.assertEqual(self.usage_counts(), {'django': 1, 'python': 1, 'web': 1})
+        self.client.delete(f'/blogs/{slug}/')
+        self.assertEqual(self.usage_counts(), {'django': 1, 'python': 0, 'web': 0})
+        Tag.objects.get(name='django').blog_set.clear()
+        self.assertEqual(self.usage_counts(), {'django': 0, 'python': 0, 'web': 0})
+
+    def test_tagging_increments_usage_without_counting_links(self):
+        self.create_blog('Popular', ['django'])
+        with CaptureQueriesContext(connection) as queries:
+            slug = self.create_blog('One', ['django', 'python'])
+            self.client.patch(f'/blogs/{slug}/', {'tag_names': ['python']}, format='json')
+        updates = [query['sql'] for query in queries if 'SET "usage_count"' in query['sql']]
+        self.assertEqual(len(updates), 2)
+        self.assertFalse([sql for sql in updates if 'COUNT(' in sql.upper()])
+        self.assertEqual(self.usage_counts(), {'django': 1, 'python': 1})
+
+    def test_bulk_import_counts_usage(self):
+        import_blogs(iter([
+            (1, {'title': 'A', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['bulk', 'django']}),
+            (2, {'title': 'B', 'body': 'Body', 'category': 'SPORTS', 'tag_names': ['bulk']}),
+        ]), self.user)
+        self.assertEqual(self.usage_counts(), {'bulk': 2, 'django': 1})
+
+    def test_prefix_search_ordering_and_pagination(self):
+        self.create_blog('One', ['Django', 'djangorest', 'python'])
+        self.create_blog('Two', ['djangorest'])
+        response = self.client.get('/tags/', {'prefix': 'DJ'})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([tag['name'] for tag in response.data['results']], ['djangorest', 'Django'])
+        self.assertEqual(response.data['results'][0]['usage_count'], 2)
+        response = self.client.get('/tags/', {'ordering': 'name', 'page_size': 2})
+        self.assertEqual([tag['name'] for tag in response.data['results']], ['Django', 'djangorest'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_prefix_uses_the_name_key_index(self):
+        plan = TagFilter({'prefix': 'dj'}, queryset=Tag.objects.all()).qs.explain()
+        self.assertRegex(plan, r'USING INDEX \S+ \(name_key>\? AND name_key<\?\)')
+
+    def test_popular_tags_are_cached_and_updated_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_blog('One', ['django', 'python'])
+        response = self.client.get('/tags/popular/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/tags/popular/').data, response.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_blog('Two', ['python', 'web'])
+        with self.assertNumQueries(0):
+            response = self.client.get('/tags/popular/', {'limit': 2})
+        self.assertEqual([(tag['name'], tag['usage_count']) for tag in response.data], [('python', 2), ('django', 1)])
+
+    @override_settings(TOP_TAGS_CACHE_SIZE=2)
+    def test_tag_leaving_a_full_top_list_rebuilds_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_blog('One', ['a', 'b'])
+            slug = self.create_blog('Two', ['a', 'b', 'c'])
+            self.create_blog('Three', ['c'])
+        self.client.get('/tags/popular/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/blogs/{slug}/', {'tag_names': ['c']}, format='json')
+        response = self.client.get('/tags/popular/')
+        self.assertEqual([(tag['name'], tag['usage_count']) for tag in response.data], [('c', 2), ('a', 1)])
+
+    def test_reconcile_fixes_usage_drift(self):
+        self.create_blog('One', ['django'])
+        Tag.objects.update(usage_count=7)
+        self.assertEqual(reconcile_blog_counters(), 1)
+        self.assertEqual(self.usage_counts(), {'django': 1})
+
+
+class BlogPreviewFieldsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='previewer',
+            email='previewer@example.com',
+            password='previewerpass',
+            profile_picture=get_temporary_image()
+        )
+        self.body = ' '.join(f'word{i}' for i in range(450))
+        self.blog = Blog.objects.create(title='Long', body=self.body, author=self.user, category='SPORTS')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_derived_fields_are_computed_on_save(self):
+        self.assertEqual(self.blog.preview_body, ' '.join(self.body.split(' ')[:30]))
+        self.assertEqual((self.blog.word_count, self.blog.reading_time), (450, 3))
+        blog = Blog.objects.get(pk=self.blog.pk)
+        blog.body = 'Short body'
+        blog.save(update_fields=['body'])
+        blog.refresh_from_db()
+        self.assertEqual((blog.preview_body, blog.word_count, blog.reading_time), ('Short body', 2, 1))
+
+    def test_update_through_api(self):
+        response = self.client.patch(f'/blogs/{self.blog.slug}/', {'body': 'New body text'}, format='json')
+        self.assertEqual(response.data['preview_body'], 'New body text')
+        self.assertEqual(response.data['word_count'], 3)
+
+    def test_bulk_import_computes_derived_fields(self):
+        import_blogs(iter([(1, {'title': 'Bulk', 'body': self.body, 'category': 'SPORTS'})]), self.user)
+        blog = Blog.objects.get(title='Bulk')
+        self.assertEqual((blog.preview_body, blog.word_count), (self.blog.preview_body, 450))
+
+    def test_preview_never_loads_bodies(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/blogs/preview/')
+        self.assertEqual(response.data['results'][0]['preview_body'], self.blog.preview_body)
+        self.assertEqual(response.data['results'][0]['reading_time'], 3)
+        self.assertNotIn('body', response.data['results'][0])
+        self.assertFalse(any('"Api_blog"."body"' in query['sql'] for query in queries.captured_queries))
+
+
+
+class BlogValuesSerializerTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        use_temporary_media_root(self.addCleanup)
+        self.authors = seed_blog_data(users=3, blogs_per_user=3)
+        generate_profile_thumbnails(self.authors[0].pk)
+        # File names that need quoting in URLs.
+        User.objects.filter(pk=self.authors[1].pk).update(profile_picture='images/profile_pictures/a b é.png')
+        Blog.objects.create(title='Untagged', body='Body', author=self.authors[2], category='FINANCE')
+        self.request = Request(APIRequestFactory().get('/blogs/'))
+        self.queryset = Blog.objects.select_related('author').prefetch_related('tags')
+
+    def test_output_is_identical_to_model_serializers(self):
+        pairs = [(PreviewBlogSerializer, PreviewBlogValuesSerializer), (BlogSerializer, BlogValuesSerializer)]
+        for serializer_class, values_serializer_class in pairs:
+            for context in ({}, {'request': self.request}):
+                with self.subTest(serializer=serializer_class.__name__, request=bool(context)):
+                    expected = serializer_class(self.queryset, many=True, context=context).data
+                    rows = values_serializer_class.values_queryset(self.queryset)
+                    with self.assertNumQueries(2):
+                        data = values_serializer_class(rows, context=context).data
+                    self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_preview_and_list_responses(self):
+        client = APIClient()
+        client.force_authenticate(user=self.authors[0])
+        for path in ('/blogs/', '/blogs/preview/', '/blogs/?pagination=cursor&page_size=4'):
+            with self.subTest(path=path):
+                response = client.get(path)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                results = response.data['results']
+                blog = Blog.objects.get(pk=results[0]['id'])
+                self.assertEqual(results[0]['tags'], [tag.name for tag in blog.tags.all()])
+                self.assertTrue(results[0]['profile_picture'].startswith('http://testserver/media/'))
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class FastJSONTests(APITestCase):
+    def setUp(self):
+        self.data = {
+            'id': 1,
+            'title': 'Caf\u00e9 \u2028 line \u2029 break',
+            'created': timezone.now(),
+            'day': timezone.now().date(),
+            'price': Decimal('1.10'),
+            'label': gettext_lazy('Lazy'),
+            'uuid': uuid.uuid4(),
+            'results': [{'tags': ['a', 'b'], 'count': None, 'ok': True}],
+            3: 'integer key',
+        }
+
+    def test_renders_the_same_bytes_as_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+        self.assertIn(b'\\u2028', expected)
+
+    def test_falls_back_for_indentation_and_long_integers(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type)
+        )
+        self.assertEqual(FastJSONRenderer().render({'id': 2 ** 70}), b'{"id":%d}' % 2 ** 70)
+
+    def test_parses_like_json_parser(self):
+        def parse(body):
+            return FastJSONParser().parse(io.BytesIO(body), parser_context={})
+
+        body = '{"title":"Caf\u00e9","tags":[1,2.5]}'.encode()
+        self.assertEqual(parse(body), {'title': 'Caf\u00e9', 'tags': [1, 2.5]})
+        self.assertEqual(parse(b'{"id":123456789012345678901234567890}'), {'id': 123456789012345678901234567890})
+        for body in (b'{"value":NaN}', b'{"title":', b'\xff'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                parse(body)
+
+    def test_api_renders_and_parses_with_orjson(self):
+        user = User.objects.create_user(username='fastjson', password='fastjsonpass')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(
+            '/blogs/', {'title': 'Fast', 'body': 'Body', 'category': 'SPORTS'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(json.loads(response.content)['title'], 'Fast')
+
+
+class StreamingListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.authors = seed_blog_data(users=2, blogs_per_user=3)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.authors[0])
+        self.queryset = Blog.objects.select_related('author').prefetch_related('tags')
+
+    def get_streamed(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_stream_json_array(self):
+        chunks = [[{'id': 1}, {'id': 2}], [], [{'id': 3}]]
+        self.assertEqual(b''.join(stream_json_array(chunks)), JSONRenderer().render([{'id': 1}, {'id': 2}, {'id': 3}]))
+        self.assertEqual(b''.join(stream_json_array([])), b'[]')
+
+    @mock.patch('Api.streaming.STREAM_CHUNK_SIZE', 2)
+    def test_blogs_are_streamed_whole_with_request_urls(self):
+        request = Request(APIRequestFactory().get('/blogs/'))
+        for path, serializer_class in (('/blogs/preview/', PreviewBlogSerializer), ('/blogs/', BlogSerializer)):
+            with self.subTest(path=path):
+                response, content = self.get_streamed(f'{path}?pagination=none')
+                expected = serializer_class(self.queryset, many=True, context={'request': request}).data
+                self.assertEqual(content, JSONRenderer().render(expected))
+                self.assertTrue(response['ETag'])
+
+        response = self.client.get('/blogs/?pagination=none', headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @mock.patch('Api.streaming.STREAM_CHUNK_SIZE', 2)
+    def test_rows_are_read_as_the_response_is_sent(self):
+        response = self.client.get('/blogs/preview/?pagination=none')
+        content = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            self.assertEqual(next(content), b'[')
+        # The rows' query and the tag names of the first two.
+        with self.assertNumQueries(2):
+            first_rows = next(content)
+        self.assertEqual(len(json.loads(b'[' + first_rows + b']')), 2)
+        self.assertEqual(len(json.loads(b'[' + first_rows + b''.join(content))), 6)
+
+    def test_tags_are_streamed_whole(self):
+        response, content = self.get_streamed('/tags/?pagination=none')
+        self.assertEqual(
+            [tag['name'] for tag in json.loads(content)],
+            list(Tag.objects.order_by('-usage_count', 'name').values_list('name', flat=True))
+        )
+        response = self.client.get('/tags/')
+        self.assertIn('results', response.data)
+
+
+class TagFilterModeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='filterer',
+            email='filterer@example.com',
+            password='filtererpass',
+            profile_picture=get_temporary_image()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for title, tag_names in (('both', ['Django', 'python']), ('django', ['django']), ('web', ['web'])):
+            blog = Blog.objects.create(title=title, body='Body', category='SPORTS', author=self.user)
+            blog.tags.set(Tag.objects.resolve(tag_names))
+
+    def get_titles(self, params):
+        response = self.client.get('/blogs/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(blog['title'] for blog in response.data['results'])
+
+    def test_tag_names_any_and_all(self):
+        self.assertEqual(self.get_titles({'tag_names': 'DJANGO,web'}), ['both', 'django', 'web'])
+        self.assertEqual(self.get_titles({'tag_names': 'DJANGO,web', 'tag_mode': 'any'}), ['both', 'django', 'web'])
+        self.assertEqual(self.get_titles({'tag_names': 'python,Django', 'tag_mode': 'all'}), ['both'])
+        self.assertEqual(self.get_titles({'tag_names': 'python,django,python', 'tag_mode': 'all'}), ['both'])
+        self.assertEqual(self.get_titles({'tag_names': 'django,missing', 'tag_mode': 'all'}), [])
+        self.assertEqual(self.get_titles({'tag_names': 'django,missing'}), ['both', 'django'])
+
+    def test_tag_ids_all(self):
+        django, python, web = (Tag.objects.get(name__iexact=name).pk for name in ('django', 'python', 'web'))
+        self.assertEqual(self.get_titles({'tags': [django, web]}), ['both', 'django', 'web'])
+        self.assertEqual(self.get_titles({'tags': [django, python], 'tag_mode': 'all'}), ['both'])
+        self.assertEqual(self.get_titles({'tags': [python, web], 'tag_mode': 'all'}), [])
+
+    def test_rejects_unknown_mode(self):
+        response = self.client.get('/blogs/', {'tag_names': 'django', 'tag_mode': 'some'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_no_join_or_distinct_over_blogs(self):
+        sql = str(BlogFilter({'tag_names': 'django,python', 'tag_mode': 'all'}, queryset=Blog.objects.all()).qs.query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('HAVING', sql)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(
+                username=f'throttled{i}',
+                email=f'throttled{i}@example.com',
+                password='throttledpass',
+                profile_picture=get_temporary_image()
+            )
+            for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[0])
+
+    @throttle_rates(user='3/min')
+    def test_user_bucket_and_headers(self):
+        for remaining in (2, 1, 0):
+            response = self.client.get('/blogs/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['RateLimit-Limit'], '3')
+            self.assertEqual(response['RateLimit-Remaining'], str(remaining))
+        response = self.client.get('/blogs/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(response['RateLimit-Remaining'], '0')
+        self.assertEqual(response['RateLimit-Reset'], '60')
+
+        self.client.force_authenticate(user=self.users[1])
+        self.assertEqual(self.client.get('/blogs/').status_code, status.HTTP_200_OK)
+
+    @throttle_rates(user='100/min', search='1/min', export='1/min')
+    def test_expensive_actions_have_their_own_buckets(self):
+        self.assertEqual(self.client.get('/blogs/', {'search': 'django'}).status_code, status.HTTP_200_OK)
+        response = self.client.get('/blogs/preview/', {'search': 'python'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.get('/blogs/').status_code, status.HTTP_200_OK)
+        response = self.client.get('/blogs/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The fuller user bucket's headers give way to the emptier export bucket's.
+        self.assertEqual(response['RateLimit-Limit'], '1')
+        self.assertEqual(self.client.get('/blogs/export/').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(application='2/min', user='100/min')
+    def test_application_bucket_is_shared_by_its_users(self):
+        application = Application.objects.create(
+            name='Throttled app',
+            user=self.users[0],
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_PASSWORD,
+        )
+        client = APIClient()
+        for user in self.users:
+            AccessToken.objects.create(
+                user=user,
+                application=application,
+                token=f'token-{user.username}',
+                expires=timezone.now() + timedelta(hours=1),
+                scope='read write',
+            )
+        statuses = [
+            client.get('/blogs/', HTTP_AUTHORIZATION=f'Bearer token-{user.username}').status_code
+            for user in (*self.users, self.users[1])
+        ]
+        self.assertEqual(statuses, [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    @throttle_rates(anon='1/min')
+    def test_anonymous_clients_are_throttled_by_address(self):
+        client = APIClient()
+        self.assertEqual(client.get('/blogs/preview/').status_code, status.HTTP_200_OK)
+        self.assertEqual(client.get('/blogs/preview/').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(client.get('/blogs/preview/', REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/blogs/preview/').status_code, status.HTTP_200_OK)
+
+    @throttle_rates(user='1/min')
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(3):
+            response = self.client.get('/blogs/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('RateLimit-Limit', response)
+
+    def test_cache_bucket_refills(self):
+        store = CacheBucketStore(cache)
+        with mock.patch('Api.throttling.time.time', return_value=100.0) as clock:
+            self.assertEqual(store.consume('bucket', 2, 0.5), (True, 1))
+            self.assertEqual(store.consume('bucket', 2, 0.5), (True, 0))
+            self.assertEqual(store.consume('bucket', 2, 0.5), (False, 0))
+            clock.return_value = 101.0
+            self.assertEqual(store.consume('bucket', 2, 0.5), (False, 0.5))
+            clock.return_value = 110.0
+            self.assertEqual(store.consume('bucket', 2, 0.5), (True, 1))
+
+    @override_settings(
+        CACHES={**settings.CACHES, 'throttle': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        THROTTLE_CACHE_ALIAS='throttle'
+    )
+    def test_shared_caches_without_atomic_updates_are_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_bucket_store()
+
+    @override_settings(
+        CACHES={**settings.CACHES, 'throttle': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}},
+        THROTTLE_CACHE_ALIAS='throttle'
+    )
+    def test_redis_buckets_are_updated_by_a_script(self):
+        store = get_bucket_store()
+        self.assertIsInstance(store, RedisBucketStore)
+        store.cache._cache = mock.Mock()
+        client = store.cache._cache.get_client.return_value
+        client.register_script.return_value.return_value = [0, b'0.25']
+        self.assertEqual(store.consume('bucket', 10, 1.0), (False, 0.25))
+        client.register_script.return_value.assert_called_once_with(
+            keys=[store.cache.make_and_validate_key('bucket')], args=[10, 1.0, 1], client=client
+        )
+
+
+@override_settings(ASYNC_VIEWS=True, ROOT_URLCONF='Api.tests.async_urls')
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='asyncuser',
+            email='asyncuser@example.com',
+            password='asyncpass',
+            profile_picture=get_temporary_image()
+        )
+        self.other = User.objects.create_user(username='asyncother', email='asyncother@example.com',
+                                              password='asyncpass')
+        self.blogs = [
+            Blog.objects.create(title=f'Async {i}', body='Body text', author=self.user, category='SPORTS')
+            for i in range(4)
+        ]
+        self.comment = Comment.objects.create(user=self.other, blog=self.blogs[0], text='First')
+        self.client = AsyncAPIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_reads_are_routed_to_async_views(self):
+        self.assertTrue(iscoroutinefunction(resolve('/blogs/').func))
+        self.assertTrue(iscoroutinefunction(resolve('/comments/').func))
+        self.assertFalse(iscoroutinefunction(resolve('/blogs/', urlconf='BlogApp.urls').func))
+
+    def test_middleware_runs_async(self):
+        # Django logs every sync-only middleware it has to adapt, which would hold a thread.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+    async def test_blog_list_and_detail(self):
+        response = await self.client.get('/blogs/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = await self.client.get('/blogs/', {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 3)
+        response = await self.client.get(response.data['next'])
+        self.assertEqual([blog['title'] for blog in response.data['results']], ['Async 0'])
+
+        slug = self.blogs[0].slug
+        response = await self.client.get(f'/blogs/{slug}/')
+        self.assertEqual(response.data['title'], 'Async 0')
+        response = await self.client.get(f'/blogs/{slug}/', headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = await self.client.get('/blogs/missing/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_preview_is_cached(self):
+        first = await self.client.get('/blogs/preview/', {'category': 'SPORTS'})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['count'], 4)
+        with mock.patch.object(BlogViewSet, 'aget_preview_data') as build:
+            second = await self.client.get('/blogs/preview/', {'category': 'SPORTS'})
+        build.assert_not_called()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    async def test_unpaginated_lists_stream_through_asgi(self):
+        response = await self.client.get('/blogs/preview/', {'pagination': 'none'})
+        self.assertTrue(response.is_async)
+        content = b''.join([part async for part in response.streaming_content])
+        self.assertEqual([blog['title'] for blog in json.loads(content)], [f'Async {i}' for i in range(3, -1, -1)])
+
+    async def test_comments(self):
+        response = await self.client.get(f'/blogs/{self.blogs[0].slug}/comments/')
+        self.assertEqual([comment['username'] for comment in response.data['results']], ['asyncother'])
+        response = await self.client.get('/comments/')
+        self.assertEqual(response.data['count'], 1)
+        response = await self.client.get(f'/comments/{self.comment.pk}/')
+        self.assertEqual(response.data['text'], 'First')
+
+    async def test_writes_keep_their_permissions(self):
+        slug = self.blogs[0].slug
+        response = await self.client.patch(f'/blogs/{slug}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.other)
+        response = await self.client.patch(f'/comments/{self.comment.pk}/', {'text': 'Edited'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.client.delete(f'/blogs/{self.blogs[1].slug}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(await Blog.objects.filter(pk=self.blogs[1].pk).aexists())
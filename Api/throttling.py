@@ -0,0 +1,212 @@
+"""
+Token-bucket throttles. Each client has a bucket per scope holding up to `num` tokens
+of its DEFAULT_THROTTLE_RATES rate ('num/period'), refilled at num per period: a
+request spends a token, so clients get bursts of up to `num` requests and `num` per
+period sustained. Clients are OAuth2 applications, users and, when anonymous, IP
+addresses; search, bulk import and export have stricter buckets of their own.
+
+Buckets live in the THROTTLE_CACHE_ALIAS cache, which must be Redis or LocMemCache.
+With Redis a bucket is updated by one Lua script, atomically across every worker. A
+LocMemCache bucket is updated under a lock of this process, which is atomic because
+the cache is the process' own; shared caches such as Memcached offer neither.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS[1]: the bucket. ARGV: capacity, tokens added per second, tokens to spend.
+# Returns {1 if they were spent else 0, tokens left}; Redis' clock, so every worker agrees.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+def parse_rate(rate):
+    """
+    (requests, seconds) of a '100/min' rate; None for no limit.
+    """
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class RedisBucketStore:
+    def __init__(self, cache):
+        self.cache = cache
+        self.script = None
+
+    def consume(self, key, capacity, rate, cost=1):
+        """
+        Spend `cost` tokens of the bucket if it has them. Returns (spent, tokens left).
+        """
+        key = self.cache.make_and_validate_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        if self.script is None:
+            self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, tokens = self.script(keys=[key], args=[capacity, rate, cost], client=client)
+        return bool(allowed), float(tokens)
+
+
+class CacheBucketStore:
+    """
+    Buckets of a LocMemCache as (tokens, updated) entries, read and written under a lock
+    of this process; they expire once full again.
+    """
+    lock = threading.Lock()
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def consume(self, key, capacity, rate, cost=1):
+        with self.lock:
+            now = time.time()
+            tokens, updated = self.cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / rate) + 1)
+        return allowed, tokens
+
+
+def get_bucket_store():
+    cache = caches[settings.THROTTLE_CACHE_ALIAS]
+    if isinstance(cache, RedisCache):
+        store = getattr(cache, '_bucket_store', None)
+        if store is None:
+            store = cache._bucket_store = RedisBucketStore(cache)
+        return store
+    if isinstance(cache, LocMemCache):
+        return CacheBucketStore(cache)
+    raise ImproperlyConfigured(
+        f'THROTTLE_CACHE_ALIAS {settings.THROTTLE_CACHE_ALIAS!r} must be a Redis or LocMemCache cache, '
+        f'{type(cache).__name__} cannot update throttle buckets atomically.'
+    )
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles requests with the bucket get_cache_key() names in its scope. Sets
+    RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset (seconds until the bucket
+    is full) from the bucket with the fewest tokens left; DRF adds Retry-After to 429s.
+    """
+    scope = None
+    cost = 1
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_cache_key(self, request, view):
+        """
+        The client's bucket, or None to let the request through.
+        """
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = self.get_scope(view)
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope)) if scope else None
+        key = self.get_cache_key(request, view) if rate else None
+        if key is None:
+            return True
+        capacity, duration = rate
+        refill = capacity / duration
+        allowed, tokens = get_bucket_store().consume(f'throttle:{scope}:{key}', capacity, refill, self.cost)
+        if not allowed:
+            self.wait_seconds = (self.cost - tokens) / refill
+        self.set_headers(view, capacity, tokens, refill)
+        return allowed
+
+    def set_headers(self, view, capacity, tokens, refill):
+        remaining = math.floor(tokens)
+        headers = getattr(view, 'headers', None)
+        if headers is None or int(headers.get('RateLimit-Remaining', remaining + 1)) <= remaining:
+            return
+        headers['RateLimit-Limit'] = str(capacity)
+        headers['RateLimit-Remaining'] = str(remaining)
+        headers['RateLimit-Reset'] = str(math.ceil((capacity - tokens) / refill))
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def get_application_id(request):
+    return getattr(request.auth, 'application_id', None)
+
+
+class ApplicationRateThrottle(TokenBucketThrottle):
+    """
+    Every request made with the tokens of an OAuth2 application, whichever their user.
+    """
+    scope = 'application'
+
+    def get_cache_key(self, request, view):
+        return get_application_id(request)
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class AnonRateThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class ActionRateThrottle(TokenBucketThrottle):
+    """
+    Expensive actions, by the scope the view's get_throttle_scope() gives them (None
+    for the others), per application, else user, else address.
+    """
+
+    def get_scope(self, view):
+        get_throttle_scope = getattr(view, 'get_throttle_scope', None)
+        return get_throttle_scope() if get_throttle_scope else None
+
+    def get_cache_key(self, request, view):
+        application_id = get_application_id(request)
+        if application_id is not None:
+            return f'application:{application_id}'
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
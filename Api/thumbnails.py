@@ -0,0 +1,121 @@
+"""
+Fixed-size profile picture thumbnails, shown on blog cards instead of the original upload.
+
+render_thumbnails is pure Pillow work, so the backfill command can run it in worker
+processes; storing the files and the user's fields happens in the calling process.
+"""
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# format: (BlogUser field, Pillow format, file extension)
+THUMBNAIL_FORMATS = {
+    'webp': ('thumbnail_webp', 'WEBP', 'webp'),
+    'jpeg': ('thumbnail_jpeg', 'JPEG', 'jpg'),
+}
+
+
+def render_thumbnails(data, size=None, quality=None):
+    """
+    {format: encoded bytes} of the image in `data`, cropped and resized to `size`.
+    """
+    size = tuple(size or settings.PROFILE_THUMBNAIL_SIZE)
+    quality = quality or settings.PROFILE_THUMBNAIL_QUALITY
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image.convert('RGBA'), size, Image.Resampling.LANCZOS)
+    # JPEG has no alpha channel, so transparent pixels are flattened onto white.
+    flat = Image.new('RGB', size, 'white')
+    flat.paste(image, mask=image.getchannel('A'))
+    rendered = {}
+    for name, (_, image_format, _) in THUMBNAIL_FORMATS.items():
+        output = io.BytesIO()
+        (image if image_format == 'WEBP' else flat).save(output, image_format, quality=quality)
+        rendered[name] = output.getvalue()
+    return rendered
+
+
+def read_picture(user):
+    """
+    Bytes of the user's profile picture, or None if it is missing or unreadable.
+    """
+    try:
+        with user.profile_picture.open('rb') as picture:
+            return picture.read()
+    except (OSError, ValueError):
+        logger.warning('Cannot read the profile picture of user %s: %r', user.pk, user.profile_picture.name)
+        return None
+
+
+def store_thumbnails(user_id, picture_name, rendered):
+    """
+    Save rendered thumbnails and point the user at them, unless the user has uploaded
+    another picture meanwhile. Returns whether the user was updated.
+    """
+    from Api.cache import invalidate_previews
+    from Api.models import Blog, BlogUser
+    from Api.oauth import invalidate_user_access_tokens
+
+    size = 'x'.join(str(value) for value in settings.PROFILE_THUMBNAIL_SIZE)
+    stem = posixpath.splitext(posixpath.basename(picture_name))[0]
+    names = {}
+    for name, (field_name, _, extension) in THUMBNAIL_FORMATS.items():
+        field = BlogUser._meta.get_field(field_name)
+        filename = field.generate_filename(None, f'{stem}_{size}.{extension}')
+        names[field_name] = field.storage.save(filename, ContentFile(rendered[name]))
+
+    # A queryset update, so a concurrent profile save isn't overwritten with stale fields.
+    updated = BlogUser.objects.filter(pk=user_id, profile_picture=picture_name).update(**names)
+    if not updated:
+        delete_thumbnail_files(names)
+        return False
+    Blog.objects.filter(author_id=user_id).touch()
+    invalidate_previews(
+        Blog.objects.filter(author_id=user_id).order_by().values_list('category', flat=True).distinct()
+    )
+    invalidate_user_access_tokens(user_id)
+    return True
+
+
+def delete_thumbnail_files(names):
+    """
+    Delete thumbnail files no user points at any more, {BlogUser field: file name}.
+    """
+    from Api.models import BlogUser
+
+    for field_name, name in names.items():
+        BlogUser._meta.get_field(field_name).storage.delete(name)
+
+
+def generate_thumbnails(user):
+    """
+    Render and store the thumbnails of one user's current profile picture.
+    """
+    data = read_picture(user)
+    if data is None:
+        return False
+    try:
+        rendered = render_thumbnails(data)
+    except (OSError, ValueError):
+        logger.warning('Cannot make thumbnails of user %s: %r', user.pk, user.profile_picture.name)
+        return False
+    return store_thumbnails(user.pk, user.profile_picture.name, rendered)
+
+
+def enqueue_thumbnails(user_id):
+    """
+    Queue thumbnail generation; cards fall back to the original picture meanwhile, and
+    the backfill_thumbnails command catches up on what a broker outage dropped.
+    """
+    from Api.tasks import generate_profile_thumbnails
+
+    try:
+        generate_profile_thumbnails.delay(user_id)
+    except Exception:
+        logger.exception('Cannot queue thumbnails of user %s', user_id)
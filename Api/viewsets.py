@@ -1,3 +1,11 @@
+from adrf.mixins import ListModelMixin as AsyncListModelMixin, RetrieveModelMixin as AsyncRetrieveModelMixin, \
+    get_data
+from adrf.viewsets import GenericViewSet as AdrfGenericViewSet
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404, aget_object_or_404
+from django.utils.functional import classproperty
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
@@ -6,10 +14,18 @@ from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, UpdateMo
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from Api.filters import BlogFilter
+from Api.bulk import import_blogs, export_blogs
+from Api.cache import cached_preview_response, acached_preview_response, get_top_tags
+from Api.conditional import conditional_response, aconditional_response, blog_detail_validators, \
+    ablog_detail_validators, blog_list_validators, ablog_list_validators
+from Api.filters import BlogFilter, TagFilter
 from Api.models import Blog, Comment, BlogUser, Tag, BLOG_CATEGORIES
+from Api.pagination import BlogPagination, CommentKeysetPagination, TagPagination, AsyncPageNumberPagination
+from Api.parsers import NDJSONParser
 from Api.permissions import IsAuthorOrReadOnly, IsUserOrReadOnly, IsSelfOrReadOnly, AllowUnauthenticatedOnly
-from Api.serializers import BlogSerializer, CommentSerializer, BlogUserSerializer, TagSerializer, PreviewBlogSerializer
+from Api.serializers import BlogSerializer, CommentSerializer, BlogUserSerializer, TagSerializer, PreviewBlogSerializer, \
+    BlogCommentSerializer, BlogValuesSerializer, PreviewBlogValuesSerializer
+from Api.streaming import streaming_json_response, iter_chunks, in_request_context
 
 
 class BlogUserViewSet(CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin, GenericViewSet):
@@ -33,12 +49,48 @@ class BlogUserViewSet(CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, De
         return [permissions.IsAuthenticated(), IsSelfOrReadOnly()]
 
 
-class BlogViewSet(viewsets.ModelViewSet):
+class AsyncGenericViewSet(AdrfGenericViewSet):
+    """
+    A GenericViewSet with async variants of its read actions ('alist' for 'list'), used
+    when settings.ASYNC_VIEWS is on, as under ASGI: they run on the async ORM, so a read
+    doesn't hold a thread while it waits on the database. Actions without a variant
+    (the writes) run in a worker thread. Under WSGI every action runs sync, as the
+    event loop per request that async views need there would only cost time.
+    Paginators must implement apaginate_queryset.
+    """
+
+    @classproperty
+    def view_is_async(cls):
+        return settings.ASYNC_VIEWS
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.view_is_async:
+            # self.action keeps the sync name, which permissions and querysets check.
+            for method, action in self.action_map.items():
+                handler = getattr(self, f'a{action}', None)
+                if iscoroutinefunction(handler):
+                    setattr(self, method, handler)
+        return request
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def get_apaginated_response(self, data):
+        # Paginated responses are built from what pagination has loaded, without queries.
+        return self.get_paginated_response(data)
+
+
+class BlogViewSet(CreateModelMixin, AsyncRetrieveModelMixin, UpdateModelMixin, DestroyModelMixin,
+                  AsyncListModelMixin, AsyncGenericViewSet):
     serializer_class = BlogSerializer
     queryset = Blog.objects.select_related('author').prefetch_related('tags')
     lookup_field = "slug"
     filter_backends = [DjangoFilterBackend]
     filterset_class = BlogFilter
+    pagination_class = BlogPagination
 
     @action(detail=False,
             methods=['get'],
@@ -47,25 +99,194 @@ class BlogViewSet(viewsets.ModelViewSet):
             name='preview',
             url_name='preview')
     def preview(self, request):
-        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_streamed():
+            # Not cached: the entry would hold every blog.
+            queryset = self.filter_queryset(self.get_queryset())
+            return conditional_response(
+                request,
+                self.get_list_validators(queryset),
+                lambda: self.get_values_response(queryset, PreviewBlogValuesSerializer)
+            )
+        return cached_preview_response(
+            request,
+            lambda: self.get_list_validators(self.filter_queryset(self.get_queryset())),
+            self.get_preview_data
+        )
+
+    def get_preview_data(self):
+        return self.get_values_response(self.filter_queryset(self.get_queryset()), PreviewBlogValuesSerializer).data
+
+    def is_streamed(self):
+        return self.paginator is None or self.paginator.is_disabled(self.request)
+
+    def get_values_response(self, queryset, serializer_class):
+        """
+        The page of `queryset` serialized by a BlogValuesSerializer from .values() rows,
+        or all of it streamed when pagination is off.
+        """
+        queryset = serializer_class.values_queryset(queryset)
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = PreviewBlogSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        serializer = PreviewBlogSerializer(queryset, many=True)
-        return Response(serializer.data)
+        if page is None:
+            return self.stream_values(queryset, serializer_class)
+        serializer = serializer_class(page, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    async def aget_values_response(self, queryset, serializer_class):
+        queryset = serializer_class.values_queryset(queryset)
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            return self.stream_values(queryset, serializer_class)
+        serializer = serializer_class(page, context=self.get_serializer_context())
+        return self.get_paginated_response(await get_data(serializer))
+
+    def stream_values(self, queryset, serializer_class):
+        context = self.get_serializer_context()
+        chunks = (
+            serializer_class(rows, context=context).data
+            for rows in iter_chunks(queryset)
+        )
+        return streaming_json_response(self.request, chunks)
+
+    async def apreview(self, request):
+        if self.is_streamed():
+            queryset = await self.afilter_queryset(self.get_queryset())
+
+            async def build_response():
+                return await self.aget_values_response(queryset, PreviewBlogValuesSerializer)
+
+            return await aconditional_response(request, await self.aget_list_validators(queryset), build_response)
+        return await acached_preview_response(
+            request,
+            self.aget_preview_validators,
+            self.aget_preview_data
+        )
+
+    async def aget_preview_validators(self):
+        return await self.aget_list_validators(await self.afilter_queryset(self.get_queryset()))
+
+    async def aget_preview_data(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        return (await self.aget_values_response(queryset, PreviewBlogValuesSerializer)).data
+
+    @action(detail=False,
+            methods=['post'],
+            parser_classes=[NDJSONParser],
+            url_path='import',
+            name='import',
+            url_name='import')
+    def bulk_import(self, request):
+        created, errors = import_blogs(request.data, request.user)
+        return Response(
+            data={'created': created, 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False,
+            methods=['get'],
+            url_path='export',
+            name='export',
+            url_name='export')
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(in_request_context(export_blogs(queryset)), content_type='application/x-ndjson')
+
+    @action(detail=True,
+            methods=['get'],
+            serializer_class=BlogCommentSerializer,
+            pagination_class=CommentKeysetPagination,
+            url_path='comments',
+            name='comments',
+            url_name='comments')
+    def comments(self, request, slug=None):
+        """
+        One page of the blog's comments, oldest first: a slug lookup and one indexed
+        range query with the commenters joined in, however many comments the blog has.
+        """
+        blog_id = get_object_or_404(Blog.objects.values_list('pk', flat=True), slug=slug)
+        page = self.paginate_queryset(self.get_comments_queryset(blog_id))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def acomments(self, request, slug=None):
+        blog_id = await aget_object_or_404(Blog.objects.values_list('pk', flat=True), slug=slug)
+        page = await self.apaginate_queryset(self.get_comments_queryset(blog_id))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(await get_data(serializer))
+
+    def get_comments_queryset(self, blog_id):
+        return Comment.objects.filter(blog_id=blog_id).select_related('user').only(
+            'id', 'user', 'text', 'created', 'updated',
+            'user__username', 'user__profile_picture', 'user__thumbnail_webp', 'user__thumbnail_jpeg'
+        )
+
+    def get_list_validators(self, queryset):
+        page_queryset = None
+        if self.paginator is not None and hasattr(self.paginator, 'get_page_queryset'):
+            page_queryset = self.paginator.get_page_queryset(queryset, self.request)
+        return blog_list_validators(self.request, queryset, page_queryset)
+
+    async def aget_list_validators(self, queryset):
+        page_queryset = None
+        if self.paginator is not None and hasattr(self.paginator, 'get_page_queryset'):
+            page_queryset = self.paginator.get_page_queryset(queryset, self.request)
+        return await ablog_list_validators(self.request, queryset, page_queryset)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return conditional_response(
+            request,
+            self.get_list_validators(queryset),
+            lambda: self.get_values_response(queryset, BlogValuesSerializer)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        async def build_response():
+            return await self.aget_values_response(queryset, BlogValuesSerializer)
+
+        return await aconditional_response(request, await self.aget_list_validators(queryset), build_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            blog_detail_validators(request, self.get_queryset(), kwargs[self.lookup_field]),
+            lambda: super(BlogViewSet, self).retrieve(request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await aconditional_response(
+            request,
+            await ablog_detail_validators(request, self.get_queryset(), kwargs[self.lookup_field]),
+            lambda: super(BlogViewSet, self).aretrieve(request, *args, **kwargs)
+        )
+
+    def get_throttle_scope(self):
+        """
+        The stricter ActionRateThrottle bucket of the expensive actions.
+        """
+        if self.action == 'bulk_import':
+            return 'bulk'
+        if self.action == 'export':
+            return 'export'
+        if self.action in ('list', 'preview') and self.request.query_params.get('search'):
+            return 'search'
+        return None
 
     def get_permissions(self):
         if self.action in ('update', 'partial_update', 'destroy'):
             return [permissions.IsAuthenticated(), IsAuthorOrReadOnly()]
         elif self.action == 'create':
             return [permissions.IsAuthenticated()]
-        elif self.action == 'preview':
+        elif self.action in ('preview', 'comments'):
             return [permissions.IsAuthenticatedOrReadOnly()]
         return [permissions.IsAuthenticated()]
 
     def get_queryset(self):
-        if self.action in ('list', 'retrieve', 'create', 'preview'):
+        if self.action == 'preview':
+            # Cards show preview_body; the body can be megabytes per row.
+            return self.queryset.defer('body')
+        if self.action in ('list', 'retrieve', 'create', 'bulk_import', 'export'):
             return self.queryset
         return self.queryset.filter(author=self.request.user)
 
@@ -76,9 +297,11 @@ class BlogViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(CreateModelMixin, AsyncRetrieveModelMixin, UpdateModelMixin, DestroyModelMixin,
+                     AsyncListModelMixin, AsyncGenericViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = AsyncPageNumberPagination
 
     def get_permissions(self):
         if self.action in ('update', 'partial_update', 'destroy'):
@@ -100,10 +323,46 @@ class CommentViewSet(viewsets.ModelViewSet):
 
 
 class TagViewSet(ListModelMixin, GenericViewSet):
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.order_by('-usage_count', 'name')
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TagFilter
+    pagination_class = TagPagination
+    default_popular_limit = 10
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            chunks = (
+                self.get_serializer(tags, many=True).data
+                for tags in iter_chunks(queryset)
+            )
+            return streaming_json_response(request, chunks)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False,
+            methods=['get'],
+            pagination_class=None,
+            filter_backends=[],
+            url_path='popular',
+            name='popular',
+            url_name='popular')
+    def popular(self, request):
+        """
+        The ?limit= (default 10) most used tags, from the incrementally maintained cache.
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.default_popular_limit))
+        except ValueError:
+            limit = self.default_popular_limit
+        limit = max(1, min(limit, settings.TOP_TAGS_CACHE_SIZE))
+        return Response([
+            {'id': tag_id, 'name': name, 'usage_count': usage_count}
+            for tag_id, name, usage_count in get_top_tags(limit)
+        ])
 
 
 class CategoryViewSet(viewsets.ViewSet):
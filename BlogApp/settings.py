@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django_celery_beat',
     'oauth2_provider',
     'rest_framework',
+    'adrf',
     'drf_spectacular',
     'corsheaders',
     'django_filters',
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Api.middleware.RequestTimingMiddleware',
+    'Api.middleware.ReadReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,11 +57,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'oauth2_provider.middleware.OAuth2TokenMiddleware',
+    'Api.middleware.AsyncOAuth2TokenMiddleware',
 ]
 
 ROOT_URLCONF = 'BlogApp.urls'
 
+# Serve reads from async views; asgi.py turns this on.
+ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -82,7 +89,69 @@ WSGI_APPLICATION = 'BlogApp.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('BLOG_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# SQLite tuned for concurrent requests on one node, enabled with BLOG_DB_PROFILE=production.
+SQLITE_PRODUCTION_PRAGMAS = {
+    # Readers no longer block the writer nor the writer the readers.
+    'journal_mode': 'WAL',
+    # With WAL, only a power loss can lose the last commits; the file can't get corrupted.
+    'synchronous': 'NORMAL',
+    # Wait up to 5s for the write lock instead of failing with "database is locked".
+    'busy_timeout': 5000,
+    # Negative: in KiB, so 64 MiB of page cache per connection.
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+DATABASE_PROFILES = {
+    'default': {},
+    'production': {
+        # Persistent connections, so the pragmas and page cache outlive a request.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRODUCTION_PRAGMAS.items()),
+            # Take the write lock when a transaction starts: a deferred transaction that
+            # reads and then writes can't wait for the lock and fails at once.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+    },
+}
+DATABASES['default'].update(DATABASE_PROFILES[os.environ.get('BLOG_DB_PROFILE', 'default')])
+
+# Read replicas: every alias besides 'default'. To try it locally, point
+# BLOG_REPLICA_SQLITE at a copy of db.sqlite3.
+if os.environ.get('BLOG_REPLICA_SQLITE'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['BLOG_REPLICA_SQLITE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['Api.routers.ReplicaRouter']
+# How long a client that wrote reads from the primary, to see its own writes.
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_CACHE_ALIAS = 'default'
+# Read from the primary even by safe requests.
+REPLICA_EXCLUDED_APPS = ['oauth2_provider', 'sessions']
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is a per-process LRU. Point 'default' at Redis or Memcached to share
+# cached responses between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogapp',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
     }
 }
 
@@ -130,6 +199,10 @@ AUTH_USER_MODEL = 'Api.BlogUser'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Profile picture thumbnails shown on blog cards (width, height).
+PROFILE_THUMBNAIL_SIZE = (128, 128)
+PROFILE_THUMBNAIL_QUALITY = 80
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
@@ -137,11 +210,51 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'Api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'Api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'Api.throttling.ApplicationRateThrottle',
+        'Api.throttling.UserRateThrottle',
+        'Api.throttling.AnonRateThrottle',
+        'Api.throttling.ActionRateThrottle',
+    ),
+    # Token buckets: 'num/period' allows bursts of num requests and num per period.
+    'DEFAULT_THROTTLE_RATES': {
+        'application': '6000/min',
+        'user': '1200/min',
+        'anon': '120/min',
+        'search': '60/min',
+        'bulk': '30/hour',
+        'export': '30/hour',
+    },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 3
 }
 
+# Dotted path to the full-text search backend behind ?search=. When unset it is
+# picked from the database vendor (SQLite FTS5, PostgreSQL tsvector, else LIKE).
+BLOG_SEARCH_BACKEND = None
+
+# Throttle buckets (Api.throttling) live in this cache, which must be Redis or LocMemCache.
+# Point it at Redis to share them between workers and nodes: its buckets are updated
+# atomically by a Lua script. Memcached and the database cache cannot update them atomically.
+THROTTLE_ENABLED = True
+THROTTLE_CACHE_ALIAS = 'default'
+
+# Cache alias and timeout (seconds) for serialized /blogs/preview/ pages.
+BLOG_PREVIEW_CACHE_ALIAS = 'default'
+BLOG_PREVIEW_CACHE_TIMEOUT = 300
+# Most used tags kept in the same cache for GET /tags/popular/.
+TOP_TAGS_CACHE_SIZE = 100
+TOP_TAGS_CACHE_TIMEOUT = 600
 
 OAUTH2_PROVIDER = {
     'SCOPES': {
@@ -152,9 +265,23 @@ OAUTH2_PROVIDER = {
     'PKCE_REQUIRED': False,
     'ACCESS_TOKEN_EXPIRE_SECONDS': 7200,
     'ROTATE_REFRESH_TOKEN': True,
-    'USE_TZ': True
+    'USE_TZ': True,
+    'OAUTH2_VALIDATOR_CLASS': 'Api.oauth.CachedOAuth2Validator',
+    'CLEAR_EXPIRED_TOKENS_BATCH_SIZE': 1000,
+    'CLEAR_EXPIRED_TOKENS_BATCH_INTERVAL': 0.05,
 }
 
+# Api.tasks.clear_tokens re-queues itself after running this many seconds.
+TOKEN_PURGE_MAX_SECONDS = 60
+
+# celery beat reads its schedule from django_celery_beat's tables, where
+# setup_periodic_tasks registers the periodic tasks.
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+# Validated access tokens are cached for this many seconds (never past their expiry).
+ACCESS_TOKEN_CACHE_ALIAS = 'default'
+ACCESS_TOKEN_CACHE_TIMEOUT = 300
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Blog API',
     'DESCRIPTION': 'API documentation Blog App',
@@ -193,5 +320,37 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
+# Per-request DB/serialization/total timings: a Server-Timing header on every
+# response and a structured record for a sample of requests.
+REQUEST_TIMING = {
+    'ENABLED': True,
+    'SERVER_TIMING_HEADER': True,
+    'SAMPLE_RATE': 0.01,
+    'SINK': 'Api.middleware.log_timing',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'Api.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'Api.tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 APPEND_SLASH = True
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['Retry-After', 'RateLimit-Limit', 'RateLimit-Remaining', 'RateLimit-Reset']